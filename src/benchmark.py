@@ -0,0 +1,186 @@
+# Imports
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import file_handler as fh
+import generators
+from history import History
+from simulation import Simulation
+
+FILES = ["orbit.txt", "simulation1.txt"]
+SIZES = [10, 100, 1000, 10000, 100000]
+# Largest simulation run with direct summation; larger ones use the tree
+DIRECT = 10000
+# Frames written and read back by the file benchmarks, each save and load repeated
+# at least REPEATS times and for at least FILE_SECONDS, keeping the fastest
+FRAMES = 8
+REPEATS = 5
+FILE_SECONDS = 0.5
+# Metrics where a larger value is better; for the others a smaller one is
+HIGHER = ["steps_per_second", "save_mb_per_second", "load_mb_per_second"]
+# Changes smaller than this are never regressions, however large relative to the old value
+FLOORS = {"peak_bytes": 2**20}
+
+def cluster(n, seed = 0):
+    # n light bodies (radius 1) spread uniformly over a disc in the middle of the
+    # window, wide enough that few of them touch, slowly rotating so they neither
+    # fly apart nor collapse at once
+    return Simulation(generators.disc(n, max(200, 3*np.sqrt(n)), spin=0.002, seed=seed))
+
+def scenarios(max_n = max(SIZES)):
+    # Name and a function building the starting simulation of every scenario
+    runs = []
+    for mode in [1, 2]:
+        for name in FILES:
+            runs.append((name+" mode "+str(mode), mode, lambda name = name: Simulation(fh.fread(name)[-1])))
+        for n in SIZES:
+            if n <= max_n:
+                runs.append(("cluster "+str(n)+" mode "+str(mode), mode, lambda n = n: cluster(n)))
+    return runs
+
+def measure_steps(make, mode, seconds):
+    # Steps per second, run for at least the given time (and at least 3 steps)
+    sim = make()
+    sim.sim_mode = mode
+    if len(sim.dynamics) > DIRECT:
+        sim.solver = "tree"
+    sim.step()
+    n, pairs = 0, 0
+    start = time.perf_counter()
+    while n < 3 or time.perf_counter() - start < seconds:
+        pairs += len(sim.dynamics)*(len(sim.dynamics) + len(sim.statics))
+        sim.step()
+        n += 1
+    elapsed = time.perf_counter() - start
+    result = {
+        "bodies": len(sim.dynamics) + len(sim.statics),
+        "solver": sim.solver,
+        "steps": n,
+        "steps_per_second": n/elapsed,
+    }
+    if sim.solver == "direct" and pairs:
+        result["ns_per_pair"] = elapsed/pairs*1e9
+    return result
+
+def measure_memory(make, mode):
+    # Peak memory allocated while building the simulation and running a step
+    tracemalloc.start()
+    sim = make()
+    sim.sim_mode = mode
+    if len(sim.dynamics) > DIRECT:
+        sim.solver = "tree"
+    sim.step()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def best_time(function):
+    # Shortest time function takes over the repeats
+    best = None
+    n = 0
+    start = time.perf_counter()
+    while n < REPEATS or time.perf_counter() - start < FILE_SECONDS:
+        t = time.perf_counter()
+        function()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+        n += 1
+    return best
+
+def measure_files(make, directory):
+    # Save and load speed of both file formats for a history of FRAMES frames (the
+    # history shares them in memory, the files store each in full)
+    sim = make()
+    history = History()
+    for i in range(FRAMES):
+        history.record(sim)
+    handler = fh.FileHandler()
+    handler.filedir = directory+os.sep
+    result = {}
+    for fmt in ["txt", "bin"]:
+        name = "benchmark."+fmt
+        saved = best_time(lambda: handler.fwrite(history, name))
+        size = os.path.getsize(handler.filedir+name)
+        loaded = best_time(lambda: [config.arrays() for config in handler.fread(name)])
+        result[fmt] = {
+            "bytes": size,
+            "save_mb_per_second": size/2**20/max(saved, 1e-9),
+            "load_mb_per_second": size/2**20/max(loaded, 1e-9),
+        }
+    return result
+
+def run(max_n = max(SIZES), seconds = 1.0, log = print):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, mode, make in scenarios(max_n):
+            result = measure_steps(make, mode, seconds)
+            result["peak_bytes"] = measure_memory(make, mode)
+            if mode == 1:
+                result["files"] = measure_files(make, directory)
+            results[name] = result
+            log(name, "\t", round(result["steps_per_second"], 1), "steps/s")
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+        },
+        "results": results,
+    }
+
+def metrics(result, prefix = ""):
+    # Flattens a scenario result into {"name": value} for every comparable metric
+    found = {}
+    for name, value in result.items():
+        if isinstance(value, dict):
+            found.update(metrics(value, prefix+name+"."))
+        elif name in HIGHER + ["ns_per_pair", "peak_bytes"]:
+            found[prefix+name] = value
+    return found
+
+def compare(old, new, threshold):
+    # Metrics that got worse by more than threshold (a fraction) and by more than
+    # their floor, as (scenario, metric, old value, new value)
+    worse = []
+    for scenario, result in new["results"].items():
+        if scenario not in old["results"]:
+            continue
+        before = metrics(old["results"][scenario])
+        for name, value in metrics(result).items():
+            if name not in before:
+                continue
+            metric = name.split(".")[-1]
+            if abs(value - before[name]) < FLOORS.get(metric, 0):
+                continue
+            higher = metric in HIGHER
+            if higher and value < before[name]*(1 - threshold) or not higher and value > before[name]*(1 + threshold):
+                worse.append((scenario, name, before[name], value))
+    return worse
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time standard simulations headlessly.")
+    parser.add_argument("--out", help="file to save the results to (JSON)")
+    parser.add_argument("--compare", help="earlier results (JSON) to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="fraction a metric may get worse by before failing (Default: 0.2)")
+    parser.add_argument("--max-n", type=int, default=max(SIZES), help="largest generated cluster")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent stepping each scenario")
+    args = parser.parse_args()
+    results = run(args.max_n, args.seconds)
+    if args.out is not None:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.compare is not None:
+        with open(args.compare) as file:
+            worse = compare(json.load(file), results, args.threshold)
+        for scenario, name, before, after in worse:
+            print("REGRESSION", scenario, name, before, "->", after)
+        if worse:
+            sys.exit(1)
+        print("No regressions beyond", str(round(args.threshold*100))+"%")
@@ -0,0 +1,131 @@
+# Imports
+import struct
+import numpy as np
+from config import Configuration, parse_setting
+
+# File layout (little endian, every array starts on an 8 byte boundary):
+#   header   magic "GRAVI\0", format version (uint16), 0 padding
+#   frame    tag "FRAM", settings length (uint32), static count, dynamic count (uint64)
+#            settings as the comma separated text of the .txt format, padded to 8 bytes
+#            static bodies as float64 rows [mass, x, y]
+#            dynamic bodies as float64 rows [mass, x, y, vx, vy]
+#   undo     (version 2) tag "UNDO" and zero counts: drops the frame before it; written by
+#            journal.Journal when a frame is undone after being appended
+#   index    (version 2) uint64 byte offset of every frame, then the frame count
+#            (uint64) and "GRAVIIDX", so the last frames can be found without reading
+#            the whole file. Files without an index are scanned frame by frame.
+MAGIC = b"GRAVI\0"
+VERSION = 2
+HEADER = struct.Struct("<6sH")
+FRAME = struct.Struct("<4sIQQ")
+FRAME_TAG = b"FRAM"
+UNDO_TAG = b"UNDO"
+TRAILER = struct.Struct("<Q8s")
+INDEX_TAG = b"GRAVIIDX"
+
+def _pad(n):
+    return -n % 8
+
+def header():
+    return HEADER.pack(MAGIC, VERSION)
+
+def is_binary(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+def encode(config):
+    static, dynamic = config.arrays()
+    settings = ",".join(str(s) for s in config.settings).encode()
+    parts = [
+        FRAME.pack(FRAME_TAG, len(settings), len(static), len(dynamic)),
+        settings + b"\0"*_pad(len(settings)),
+        np.ascontiguousarray(static, dtype="<f8").tobytes(),
+        np.ascontiguousarray(dynamic, dtype="<f8").tobytes(),
+    ]
+    return b"".join(parts)
+
+def undo():
+    return FRAME.pack(UNDO_TAG, 0, 0, 0)
+
+def decode(data, offset):
+    # The frame at offset and the offset just after it. The body arrays are views
+    # into data, so nothing is done per body.
+    tag, ls, ns, nd = FRAME.unpack_from(data, offset)
+    if tag != FRAME_TAG:
+        raise ValueError("not a frame at byte "+str(offset))
+    offset += FRAME.size
+    text = bytes(data[offset:offset+ls]).decode()
+    settings = [parse_setting(i, s) for i, s in enumerate(text.split(","))] if text else []
+    offset += ls + _pad(ls)
+    static = np.frombuffer(data, "<f8", ns*3, offset).reshape(ns, 3)
+    offset += ns*24
+    dynamic = np.frombuffer(data, "<f8", nd*5, offset).reshape(nd, 5)
+    offset += nd*40
+    return Configuration(static, dynamic, settings), offset
+
+def frame_size(data, offset):
+    tag, ls, ns, nd = FRAME.unpack_from(data, offset)
+    return FRAME.size + ls + _pad(ls) + ns*24 + nd*40
+
+def check_header(data):
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a gravi binary file")
+    if version > VERSION:
+        raise ValueError("binary format version "+str(version)+" is newer than this program ("+str(VERSION)+")")
+    return HEADER.size
+
+def dumps(history):
+    parts = [header()]
+    offsets = []
+    offset = HEADER.size
+    for config in history:
+        frame = encode(config)
+        offsets.append(offset)
+        offset += len(frame)
+        parts.append(frame)
+    parts.append(np.array(offsets, dtype="<u8").tobytes())
+    parts.append(TRAILER.pack(len(offsets), INDEX_TAG))
+    return b"".join(parts)
+
+def index(data):
+    # Start and end byte offsets of every frame
+    offset = check_header(data)
+    end = len(data)
+    if end - offset >= TRAILER.size:
+        count, tag = TRAILER.unpack_from(data, end - TRAILER.size)
+        if tag == INDEX_TAG:
+            end -= TRAILER.size + 8*count
+            starts = np.frombuffer(data, "<u8", count, end).astype(np.int64)
+            return starts, np.append(starts[1:], end)
+    # no index: walk the records, replaying undos; a torn last record is ignored
+    starts, ends = [], []
+    while offset + FRAME.size <= end:
+        tag = FRAME.unpack_from(data, offset)[0]
+        size = frame_size(data, offset)
+        if tag not in [FRAME_TAG, UNDO_TAG] or offset + size > end:
+            break
+        if tag == UNDO_TAG:
+            if starts:
+                starts.pop()
+                ends.pop()
+        else:
+            starts.append(offset)
+            ends.append(offset + size)
+        offset += size
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+def write_frames(file, data, starts, ends):
+    # Copy already encoded frames from data into a new indexed file
+    file.write(header())
+    offsets = []
+    offset = HEADER.size
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        file.write(data[start:end])
+        offsets.append(offset)
+        offset += end - start
+    file.write(np.array(offsets, dtype="<u8").tobytes())
+    file.write(TRAILER.pack(len(offsets), INDEX_TAG))
+
+def loads(data):
+    starts, ends = index(data)
+    return [decode(data, int(start))[0] for start in starts]
@@ -16,7 +16,7 @@ class StaticBody:
 
     def increase_mass(self, mass):
         self.mass += mass
-        self.radius = ceil(4*mass**(1/3))
+        self.radius = ceil(4*self.mass**(1/3))
 
     def dist(self, other):
         return abs(other.pos - self.pos)
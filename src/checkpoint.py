@@ -0,0 +1,125 @@
+# Imports
+import os
+import json
+import time
+import struct
+import numpy as np
+import binary
+from simulation import Simulation
+
+# A checkpoint is a binary simulation file (see binary.py) holding one frame, with a
+# state record between the header and the frame:
+#   state    tag "STAT", meta length (uint32), dynamic count, static count (uint64)
+#            meta as JSON (step counter, time, counters, store versions and next ids,
+#            whether the accelerations are current, random generator state), padded
+#            to 8 bytes
+#            ids of the dynamic bodies, then of the static bodies (int64)
+#            accelerations of the dynamic bodies as float64 rows [ax, ay]
+# The frame holds the bodies and settings as usual, so file_handler.fread opens a
+# checkpoint like any other simulation (without the extra state).
+STATE = struct.Struct("<4sIQQ")
+STATE_TAG = b"STAT"
+
+def is_checkpoint(path):
+    with open(path, "rb") as file:
+        data = file.read(binary.HEADER.size + STATE.size)
+    return binary.is_binary(data) and len(data) == binary.HEADER.size + STATE.size and data[binary.HEADER.size:binary.HEADER.size + 4] == STATE_TAG
+
+def dumps(sim):
+    s, d = sim.statics, sim.dynamics
+    meta = json.dumps({
+        "steps": sim.steps,
+        "time": sim.time,
+        "removed": sim.removed,
+        "evaluations": sim.evaluations,
+        "stores": [[store.next_id, store.version, store.edited] for store in [d, s]],
+        "acc_current": sim._acc_key == sim.acc_key(),
+        "seed": sim.seed,
+        "rng": sim.rng.bit_generator.state,
+    }).encode()
+    parts = [
+        binary.header(),
+        STATE.pack(STATE_TAG, len(meta), len(d), len(s)),
+        meta + b"\0"*binary._pad(len(meta)),
+        np.ascontiguousarray(d.ids, dtype="<i8").tobytes(),
+        np.ascontiguousarray(s.ids, dtype="<i8").tobytes(),
+        np.ascontiguousarray(d.acc, dtype="<f8").tobytes(),
+    ]
+    # index of the one frame, as binary.dumps writes it
+    offset = sum(len(part) for part in parts)
+    parts.append(binary.encode(sim.config()))
+    parts.append(np.array([offset], dtype="<u8").tobytes())
+    parts.append(binary.TRAILER.pack(1, binary.INDEX_TAG))
+    return b"".join(parts)
+
+def save(sim, path):
+    # Written next to path and renamed over it once complete and on disk, so a crash
+    # while saving leaves the previous checkpoint
+    data = dumps(sim)
+    with open(path+".tmp", "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path+".tmp", path)
+    return len(data)
+
+def loads(data):
+    offset = binary.check_header(data)
+    tag, lm, nd, ns = STATE.unpack_from(data, offset)
+    if tag != STATE_TAG:
+        raise ValueError("not a gravi checkpoint")
+    offset += STATE.size
+    meta = json.loads(bytes(data[offset:offset + lm]).decode())
+    offset += lm + binary._pad(lm)
+    dids = np.frombuffer(data, "<i8", nd, offset)
+    offset += 8*nd
+    sids = np.frombuffer(data, "<i8", ns, offset)
+    offset += 8*ns
+    acc = np.frombuffer(data, "<f8", 2*nd, offset).reshape(nd, 2)
+    offset += 16*nd
+    config = binary.decode(data, offset)[0]
+    sim = Simulation(config, meta["seed"])
+    sim.rng.bit_generator.state = meta["rng"]
+    for store, ids, (next_id, version, edited) in [(sim.dynamics, dids, meta["stores"][0]), (sim.statics, sids, meta["stores"][1])]:
+        store.ids[:] = ids
+        store.next_id, store.version, store.edited = next_id, version, edited
+    sim.dynamics.acc = acc
+    sim.steps, sim.time = meta["steps"], meta["time"]
+    sim.removed, sim.evaluations = meta["removed"], meta["evaluations"]
+    if meta["acc_current"]:
+        sim._acc_key = sim.acc_key()
+    return sim
+
+def load(path):
+    # The simulation exactly as it was saved: stepping it gives the same results, bit
+    # for bit, as stepping the simulation that was saved
+    with open(path, "rb") as file:
+        return loads(file.read())
+
+class Checkpointer:
+
+    # Saves a checkpoint of a simulation to path every `every` steps and/or every
+    # `seconds` seconds (0 turns either off), always over the previous one.
+    # Used as an observer of a simulation: sim.observers.append(checkpointer.check)
+    def __init__(self, path, every = 0, seconds = 0):
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self.saved = 0
+        self.last = time.monotonic()
+
+    # Methods
+    def check(self, sim):
+        now = time.monotonic()
+        if self.every and sim.steps % self.every == 0 or self.seconds and now - self.last >= self.seconds:
+            self.save(sim)
+
+    def save(self, sim):
+        save(sim, self.path)
+        self.saved += 1
+        self.last = time.monotonic()
+
+if __name__ == "__main__":
+    import sys
+    sim = load(sys.argv[1])
+    print(sim, "at step", sim.steps, "(time", str(sim.time)+"), seed", sim.seed)
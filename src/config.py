@@ -1,18 +1,78 @@
+# Imports
+import numpy as np
+from bodies import StaticBody, DynamicBody
+
+# Names and default values of Configuration.settings, in the order they are saved.
+# Files saved before a setting existed load with its default value.
+SETTINGS = [
+    ("size", 500),
+    ("buffer", 2000),
+    ("sim_mode", 1),
+    ("cmass", 3.0),
+    ("time_step", 1.0),
+    ("g_const", 1.2),
+    ("wall", True),
+    ("gravity", True),
+    ("tracing", False),
+    ("solver", "direct"),
+    ("theta", 0.5),
+    ("integrator", "euler"),
+    ("eta", 0.05),
+    ("max_level", 8),
+    ("workers", 1),
+    ("static_field", 0.0),
+    ("mesh_size", 256),
+    ("mesh_pad", 2.0),
+]
+
+def parse_setting(i, text):
+    default = SETTINGS[i][1]
+    if isinstance(default, bool):
+        return text == "True"
+    return type(default)(text)
+
+def _array(value, columns):
+    if isinstance(value, np.ndarray):
+        return value
+    if columns == 3:
+        rows = [[body.mass, body.pos.x, body.pos.y] for body in value]
+    else:
+        rows = [[body.mass, body.pos.x, body.pos.y, body.vel.x, body.vel.y] for body in value]
+    return np.array(rows, dtype=float).reshape(len(rows), columns)
+
 class Configuration:
 
+    # Bodies are given either as lists of StaticBody/DynamicBody or as packed arrays
+    # with rows [mass, x, y] (static) and [mass, x, y, vx, vy] (dynamic).
     def __init__(self, static, dynamic, settings):
         self.settings = settings
-        self.static = static
-        self.dynamic = dynamic
+        self._static = static
+        self._dynamic = dynamic
 
     def __repr__(self):
-        return str(len(self.static))+" static bodies, "+str(len(self.dynamic))+" dynamic bodies"
+        return str(len(self._static))+" static bodies, "+str(len(self._dynamic))+" dynamic bodies"
+
+    @property
+    def static(self):
+        if isinstance(self._static, np.ndarray):
+            self._static = [StaticBody(m, [x, y]) for m, x, y in self._static.tolist()]
+        return self._static
+
+    @property
+    def dynamic(self):
+        if isinstance(self._dynamic, np.ndarray):
+            self._dynamic = [DynamicBody(m, [x, y], [dx, dy]) for m, x, y, dx, dy in self._dynamic.tolist()]
+        return self._dynamic
+
+    def arrays(self):
+        return _array(self._static, 3), _array(self._dynamic, 5)
 
     def short(self):
-        s = "|".join(str(body) for body in self.static)
+        static, dynamic = self.arrays()
+        s = "|".join(",".join(str(x) for x in row) for row in static.tolist())
         if s == "":
             s = "0"
-        d = "|".join(str(body) for body in self.dynamic)
+        d = "|".join(",".join(str(x) for x in row) for row in dynamic.tolist())
         if d == "":
             d = "0"
         t = ",".join(str(s) for s in self.settings)
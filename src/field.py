@@ -0,0 +1,100 @@
+# Imports
+import numpy as np
+import gravity
+import parallel
+import spatial
+
+# Width of the near field around every static body, in grid cells
+NEAR = 8
+
+def kernel(d2, gm, cutoff):
+    # Acceleration per unit of separation of the smooth force the grid is built from:
+    # exactly gm/d**3 beyond cutoff, and inside it a polynomial matching it up to the
+    # second derivative at cutoff that stays finite at d = 0
+    d = np.sqrt(d2)
+    s2 = d2/cutoff**2
+    inner = (4.375 - 5.25*s2 + 1.875*s2*s2)/cutoff**3
+    w = np.divide(1, d2*d, out=inner, where=d >= cutoff)
+    return gm*w
+
+def weights(f):
+    # Catmull-Rom weights of the four grid points around fractional position f
+    f2, f3 = f*f, f*f*f
+    return [(-f3 + 2*f2 - f)/2, (3*f3 - 5*f2 + 2)/2, (-3*f3 + 4*f2 + f)/2, (f3 - f2)/2]
+
+class StaticField:
+
+    # Acceleration from the static bodies sampled on a grid of square cells covering
+    # [lo, hi] on both axes and interpolated bicubically. The grid only holds the smooth
+    # force; within the near field of a static body the difference to the exact force
+    # (with the usual contact rules) is added body by body, so the result only differs
+    # from direct summation by the interpolation error of the smooth far field.
+    def __init__(self, pos, mass, radius, g_const, lo, hi, cell, workers = 1):
+        self.pos, self.mass, self.radius = pos.copy(), mass.copy(), radius.copy()
+        self.g_const = g_const
+        self.lo, self.cell = lo, cell
+        self.cutoff = NEAR*cell
+        self.cells = max(1, int(np.ceil((hi - lo)/cell)))
+        axis = lo + cell*np.arange(-1, self.cells + 2)
+        gx, gy = np.meshgrid(axis, axis, indexing="ij")
+        nodes = np.column_stack((gx.ravel(), gy.ravel()))
+        grid = np.zeros((len(nodes), 2))
+        gm = g_const*self.mass
+
+        def block(i, j):
+            dx = self.pos[:, 0] - nodes[i:j, 0, None]
+            dy = self.pos[:, 1] - nodes[i:j, 1, None]
+            w = kernel(dx*dx + dy*dy, gm, self.cutoff)
+            grid[i:j, 0] = (w*dx).sum(axis=1)
+            grid[i:j, 1] = (w*dy).sum(axis=1)
+
+        parallel.blocks(block, len(nodes), gravity.block_rows(len(self.pos)), workers)
+        self.grid = grid.reshape(self.cells + 3, self.cells + 3, 2)
+
+    # Methods
+    def nbytes(self):
+        return self.grid.nbytes
+
+    def accelerations(self, tpos, tradius):
+        n = len(tpos)
+        acc = np.zeros((n, 2))
+        u = (tpos - self.lo)/self.cell
+        inside = ((u >= 0) & (u <= self.cells)).all(axis=1)
+
+        # smooth part, interpolated bicubically from the 4x4 surrounding grid points
+        # (the grid has one extra point on every side)
+        k = np.minimum(u[inside].astype(np.int64), self.cells - 1)
+        f = u[inside] - k
+        wx, wy = weights(f[:, 0]), weights(f[:, 1])
+        g = self.grid
+        part = np.zeros((len(k), 2))
+        for a in range(4):
+            row = np.zeros((len(k), 2))
+            for b in range(4):
+                row += g[k[:, 0] + a, k[:, 1] + b]*wy[b][:, None]
+            part += row*wx[a][:, None]
+        acc[inside] = part
+
+        # exact minus smooth force of the static bodies close to each target; pairs
+        # further apart than the cutoff only differ if they touch
+        t = np.flatnonzero(inside)
+        if len(t) and len(self.pos):
+            reach = max(self.cutoff, float(tradius[t].max() + self.radius.max()))
+            a, s = spatial.near(tpos[t], self.pos, reach)
+            a = t[a]
+            dx, dy = self.pos[s, 0] - tpos[a, 0], self.pos[s, 1] - tpos[a, 1]
+            d2 = dx*dx + dy*dy
+            close = d2 < reach*reach
+            a, s, dx, dy, d2 = a[close], s[close], dx[close], dy[close], d2[close]
+            d = np.sqrt(d2)
+            gm = self.g_const*self.mass[s]
+            far = (d >= tradius[a] + self.radius[s]) & (d > 0)
+            w = np.divide(gm, d2*d, out=np.zeros_like(d), where=far) - kernel(d2, gm, self.cutoff)
+            acc[:, 0] += np.bincount(a, w*dx, n)
+            acc[:, 1] += np.bincount(a, w*dy, n)
+
+        # bodies off the grid (they are removed at the start of the next step)
+        out = ~inside
+        if out.any():
+            acc[out] = gravity.direct(tpos[out], tradius[out], self.pos, self.mass, self.radius, self.g_const)
+        return acc
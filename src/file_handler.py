@@ -1,7 +1,11 @@
 # Imports
 import os
+import mmap
+import numpy as np
 from bodies import StaticBody, DynamicBody
-from config import Configuration
+from config import Configuration, parse_setting
+import binary
+from journal import Journal
 
 def convert(txt):
     content = txt.split(" ")
@@ -17,40 +21,133 @@ def convert(txt):
         for info in dynamic:
             mass, x, y, dx, dy = info.split(",")
             dynamic_bodies.append(DynamicBody(float(mass), [float(x), float(y)], [float(dx), float(dy)]))
-    settings = content[2].split(",")
+    settings = content[2].strip().split(",")
     for i in range(len(settings)):
-        if i < 3:
-            settings[i] = int(settings[i])
-        elif i < 6:
-            settings[i] = float(settings[i])
-        else:
-            settings[i] = settings[i]=="True"
+        settings[i] = parse_setting(i, settings[i])
     return Configuration(static_bodies, dynamic_bodies, settings)
 
+# Bytes scanned at a time when indexing the lines of a text file
+SCAN = 1 << 26
+
+def line_index(data):
+    starts, ends = [np.zeros(1, dtype=np.int64)], []
+    for offset in range(0, len(data), SCAN):
+        chunk = np.frombuffer(data, np.uint8, min(SCAN, len(data) - offset), offset)
+        newlines = np.flatnonzero(chunk == 10) + offset
+        ends.append(newlines)
+        starts.append(newlines + 1)
+    starts, ends = np.concatenate(starts), np.concatenate(ends + [[len(data)]])
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+class FrameReader:
+
+    # Lazily decoded frames of a saved simulation. The file is memory mapped and
+    # only the frames that are accessed are decoded, so opening a file costs the
+    # same however many frames it holds.
+    def __init__(self, data, starts, ends, text):
+        self.data = data
+        self.starts = starts
+        self.ends = ends
+        self.text = text
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return FrameReader(self.data, self.starts[i], self.ends[i], self.text)
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("frame index out of range")
+        if self.text:
+            return convert(bytes(self.data[self.starts[i]:self.ends[i]]).decode())
+        return binary.decode(self.data, int(self.starts[i]))[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self[i]
+
+    def __repr__(self):
+        return str(len(self))+" frames"
+
+    def pop(self):
+        config = self[-1]
+        self.starts, self.ends = self.starts[:-1], self.ends[:-1]
+        return config
+
 class FileHandler:
 
     filedir = "configs/"
 
-    def fwrite(self, history, name):
-        file = open(self.filedir+name+".txt", "w")
-        file.write("".join(config.short()+"\n" for config in history))
+    def fwrite(self, history, name, fmt = "txt"):
+        # fmt is "txt" or "bin"; a name ending in .txt or .bin picks the format itself
+        name, ext = os.path.splitext(name)
+        if ext in [".txt", ".bin"]:
+            fmt = ext[1:]
+        elif ext:
+            name += ext
+        # written next to the old file and renamed over it, because history may
+        # still be reading frames from the old file
+        path = self.filedir+name+"."+fmt
+        if fmt == "bin":
+            file = open(path+".tmp", "wb")
+            file.write(binary.dumps(history))
+        else:
+            file = open(path+".tmp", "w")
+            file.write("".join(config.short()+"\n" for config in history))
         file.close()
+        os.replace(path+".tmp", path)
 
     def fdir(self):
         return os.listdir(self.filedir)
 
+    def fpath(self, name):
+        return self.filedir+name
+
     def fread(self, name):
-        return [convert(line) for line in open(self.filedir+name, "r").readlines()]
+        file = open(self.fpath(name), "rb")
+        if os.fstat(file.fileno()).st_size == 0:
+            file.close()
+            return []
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        file.close()
+        if binary.is_binary(data):
+            starts, ends = binary.index(data)
+            return FrameReader(data, starts, ends, False)
+        starts, ends = line_index(data)
+        return FrameReader(data, starts, ends, True)
+
+    def fjournal(self, name):
+        # Journal appending to the binary file name (see journal.py)
+        return Journal(self.fpath(os.path.splitext(name)[0]+".bin"))
+
+    def fconvert(self, name, fmt):
+        # Save the file name in the other format, next to the original
+        self.fwrite(self.fread(name), os.path.splitext(name)[0], fmt)
 
 _inst = FileHandler()
 fwrite = _inst.fwrite
 fdir = _inst.fdir
+fpath = _inst.fpath
 fread = _inst.fread
+fjournal = _inst.fjournal
+fconvert = _inst.fconvert
 
 if hasattr(os, "fork"):
     os.register_at_fork(after_in_child = _inst.__init__)
 
 if __name__ == "__main__":
+    import sys
     fh = FileHandler()
-    print(fh.fdir())
-    print(fh.fread(input()))
+    if len(sys.argv) == 3:
+        # python file_handler.py orbit.txt bin
+        fh.fconvert(sys.argv[1], sys.argv[2])
+    else:
+        print(fh.fdir())
+        print(fh.fread(input()))
@@ -0,0 +1,141 @@
+# Imports
+import argparse
+import numpy as np
+from config import Configuration, SETTINGS, parse_setting
+from store import body_radius
+
+# Every generator returns a Configuration holding packed arrays (rows [mass, x, y]
+# for static bodies and [mass, x, y, vx, vy] for dynamic ones), so Simulation(config)
+# or sim.load(config) fills the body stores without creating a body object each.
+# Bodies are placed around center (Default: the middle of the window) and the same
+# seed always gives the same bodies.
+NAMES = [name for name, default in SETTINGS]
+DEFAULTS = dict(SETTINGS)
+# Plummer spheres are cut off at this many scale radii (they would otherwise reach
+# infinitely far); 99.1% of the mass lies within it
+CUTOFF = 10
+
+def _center(center):
+    if center is None:
+        return np.array([DEFAULTS["size"]/2, DEFAULTS["size"]/2])
+    return np.asarray(center, dtype=float)
+
+def _masses(rng, n, mass, spread):
+    # Masses spread uniformly over mass*(1 - spread) to mass*(1 + spread)
+    return rng.uniform(mass*(1 - spread), mass*(1 + spread), n)
+
+def _config(static, dynamic, settings):
+    values = [DEFAULTS[name] for name in NAMES]
+    for name, value in (settings or {}).items():
+        values[NAMES.index(name)] = value
+    return Configuration(np.asarray(static, dtype=float).reshape(-1, 3), np.asarray(dynamic, dtype=float).reshape(-1, 5), values)
+
+def _isotropic(rng, n, length):
+    # n vectors of the given lengths pointing in random directions in space, of
+    # which only x and y are kept (the sphere seen from above)
+    z = rng.uniform(-1, 1, n)
+    a = 2*np.pi*rng.random(n)
+    s = length*np.sqrt(1 - z*z)
+    return np.column_stack((s*np.cos(a), s*np.sin(a)))
+
+def _plummer(rng, n, scale, mass, spread, g_const):
+    # Positions and velocities of a Plummer sphere in equilibrium (Aarseth, Henon and
+    # Wielen 1974), around the origin at rest
+    m = _masses(rng, n, mass, spread)
+    # radius from the mass fraction inside it, drawn below the fraction inside CUTOFF
+    inside = CUTOFF**3/(CUTOFF**2 + 1)**1.5
+    x = rng.uniform(0, inside, n)
+    r = scale/np.sqrt(x**(-2/3) - 1)
+    pos = _isotropic(rng, n, r)
+    # speed as a fraction q of the escape speed, drawn from q^2 (1 - q^2)^(7/2) by
+    # rejection, all bodies at once until every one has been accepted
+    q = np.zeros(n)
+    todo = np.arange(n)
+    while len(todo):
+        a, b = rng.random(len(todo)), 0.1*rng.random(len(todo))
+        ok = b < a*a*(1 - a*a)**3.5
+        q[todo[ok]] = a[ok]
+        todo = todo[~ok]
+    escape = np.sqrt(2*g_const*m.sum()/scale)*(1 + (r/scale)**2)**-0.25
+    vel = _isotropic(rng, n, q*escape)
+    return m, pos, vel
+
+def disc(n, radius = 200, mass = 0.01, spread = 0.5, spin = 0.0, center = None, seed = 0, settings = None):
+    # n bodies spread uniformly over a disc, turning around its center at spin radians
+    # per unit of time
+    rng = np.random.default_rng(seed)
+    c = _center(center)
+    r = radius*np.sqrt(rng.random(n))
+    a = 2*np.pi*rng.random(n)
+    pos = np.column_stack((c[0] + r*np.cos(a), c[1] + r*np.sin(a)))
+    vel = spin*np.column_stack((-(pos[:, 1] - c[1]), pos[:, 0] - c[0]))
+    m = _masses(rng, n, mass, spread)
+    return _config([], np.column_stack((m, pos, vel)), settings)
+
+def plummer(n, scale = 50, mass = 0.01, spread = 0.0, center = None, velocity = (0, 0), seed = 0, settings = None):
+    # Plummer sphere with scale radius `scale` (half the mass lies within 1.3 scale
+    # radii), moving at velocity as a whole
+    g_const = (settings or {}).get("g_const", DEFAULTS["g_const"])
+    m, pos, vel = _plummer(np.random.default_rng(seed), n, scale, mass, spread, g_const)
+    dynamic = np.column_stack((m, pos + _center(center), vel + np.asarray(velocity, dtype=float)))
+    return _config([], dynamic, settings)
+
+def kepler(n, inner = None, outer = 200, central = 300.0, mass = 0.01, spread = 0.5, center = None, seed = 0, settings = None):
+    # Disc of bodies with a uniform surface density between radii inner and outer, on
+    # circular orbits around a static body of mass central. Each orbit accounts for the
+    # central body and the disc bodies inside it. By default the disc starts at twice
+    # the radius of the central body, since touching bodies exert no force.
+    g_const = (settings or {}).get("g_const", DEFAULTS["g_const"])
+    rng = np.random.default_rng(seed)
+    c = _center(center)
+    if inner is None:
+        inner = 2*float(body_radius(central))
+    r = np.sqrt(inner**2 + (outer**2 - inner**2)*rng.random(n))
+    a = 2*np.pi*rng.random(n)
+    m = _masses(rng, n, mass, spread)
+    order = np.argsort(r)
+    enclosed = np.empty(n)
+    enclosed[order] = np.cumsum(m[order]) - m[order]
+    v = np.sqrt(g_const*(central + enclosed)/r)
+    dynamic = np.column_stack((m, c[0] + r*np.cos(a), c[1] + r*np.sin(a), -v*np.sin(a), v*np.cos(a)))
+    return _config([[central, c[0], c[1]]], dynamic, settings)
+
+def collision(n, scale = 30, mass = 0.01, spread = 0.0, distance = 200, speed = 0.5, impact = 20, center = None, seed = 0, settings = None):
+    # Two Plummer spheres of n/2 bodies each, distance apart along x and offset by
+    # impact along y, heading towards each other at speed
+    g_const = (settings or {}).get("g_const", DEFAULTS["g_const"])
+    rng = np.random.default_rng(seed)
+    c = _center(center)
+    halves = []
+    for k, side in [(n//2, -1), (n - n//2, 1)]:
+        m, pos, vel = _plummer(rng, k, scale, mass, spread, g_const)
+        pos = pos + c + side*np.array([distance/2, impact/2])
+        vel = vel - side*np.array([speed/2, 0])
+        halves.append(np.column_stack((m, pos, vel)))
+    return _config([], np.concatenate(halves), settings)
+
+GENERATORS = {"disc": disc, "plummer": plummer, "kepler": kepler, "collision": collision}
+
+if __name__ == "__main__":
+    import file_handler as fh
+    parser = argparse.ArgumentParser(description="Generate a simulation with many bodies and save it to configs/.")
+    parser.add_argument("kind", choices=list(GENERATORS), help="kind of simulation to generate")
+    parser.add_argument("n", type=int, help="number of dynamic bodies")
+    parser.add_argument("out", help="file name in configs/ (.txt or .bin)")
+    parser.add_argument("settings", nargs="*", help="settings saved with the simulation, e.g. g_const=2.4 integrator=leapfrog")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mass", type=float, help="average mass of the bodies")
+    parser.add_argument("--radius", type=float, help="radius of the disc, or of the Plummer spheres (scale radius)")
+    args = parser.parse_args()
+    settings = {}
+    for item in args.settings:
+        name, value = item.split("=", 1)
+        settings[name] = parse_setting(NAMES.index(name), value)
+    options = {"seed": args.seed, "settings": settings}
+    if args.mass is not None:
+        options["mass"] = args.mass
+    if args.radius is not None:
+        options[{"disc": "radius", "kepler": "outer"}.get(args.kind, "scale")] = args.radius
+    config = GENERATORS[args.kind](args.n, **options)
+    fh.fwrite([config], args.out)
+    print(args.out, "saved:", config)
@@ -0,0 +1,237 @@
+# Imports
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+
+# Runs simulations without a window, e.g. from a job queue:
+#
+#   python -m gravi run configs/orbit.txt --steps 100000 --out result.bin --integrator leapfrog --backend tree
+#
+# Only the modules a command needs are imported, and only when it runs, so pygame is
+# never loaded unless the run is shown with --render (and asyncio only with --stream).
+
+# Exit codes
+OK = 0
+FAILED = 1          # the input could not be read, a setting is wrong or the output could not be saved
+USAGE = 2           # wrong arguments (also used by argparse)
+UNSTABLE = 3        # positions or velocities stopped being finite numbers
+INTERRUPTED = 130   # stopped with Ctrl+C or by closing the window (the output is still saved, unless
+                    # Ctrl+C was pressed twice)
+
+def fail(message, code = FAILED):
+    print("gravi: error:", message, file=sys.stderr)
+    return code
+
+def resolve(path):
+    # Files are looked for as given and then in configs/, like the O key does
+    if not os.path.exists(path) and os.path.exists(os.path.join("configs", path)):
+        return os.path.join("configs", path)
+    return path
+
+def duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return str(seconds//3600)+"h"+str(seconds//60 % 60).zfill(2)+"m"
+    if seconds >= 60:
+        return str(seconds//60)+"m"+str(seconds % 60).zfill(2)+"s"
+    return str(seconds)+"s"
+
+def progress(sim, done, steps, seconds):
+    rate = done/seconds if seconds > 0 else 0.0
+    line = "step "+str(done)+"/"+str(steps)+" ("+str(round(100*done/max(steps, 1), 1))+"%)"
+    line += "  "+str(round(rate, 1))+" steps/s  "+str(len(sim.dynamics))+" bodies"
+    if rate > 0:
+        line += "  eta "+duration((steps - done)/rate)
+    print(line, file=sys.stderr, flush=True)
+
+def settings(items):
+    # "name=value" arguments as {name: value}
+    from config import SETTINGS, parse_setting
+    names = [name for name, default in SETTINGS]
+    found = {}
+    for item in items:
+        name, equals, value = item.partition("=")
+        if not equals or name not in names:
+            raise ValueError("unknown setting "+repr(item)+" (settings are "+", ".join(names)+")")
+        found[name] = parse_setting(names.index(name), value)
+    return found
+
+def run(args):
+    import numpy as np
+    import checkpoint
+    import file_handler
+    from integrators import INTEGRATORS
+    from simulation import Simulation, SOLVERS
+    handler = file_handler.FileHandler()
+    handler.filedir = ""
+    try:
+        changes = settings(args.settings)
+    except ValueError as e:
+        return fail(e, USAGE)
+    for name, value in [("integrator", args.integrator), ("solver", args.backend), ("workers", args.workers)]:
+        if value is not None:
+            changes[name] = value
+    if changes.get("integrator", "euler") not in INTEGRATORS:
+        return fail("unknown integrator "+repr(changes["integrator"])+" (choose from "+", ".join(INTEGRATORS)+")", USAGE)
+    if changes.get("solver", "direct") not in SOLVERS:
+        return fail("unknown backend "+repr(changes["solver"])+" (choose from "+", ".join(SOLVERS)+")", USAGE)
+    path = resolve(args.config)
+    if args.command == "resume":
+        args.frame, args.seed, args.checkpoint = -1, None, path
+    try:
+        # a checkpoint continues exactly where it was saved
+        if checkpoint.is_checkpoint(path):
+            sim = checkpoint.load(path)
+        elif args.command == "resume":
+            return fail(args.config+" is not a checkpoint", USAGE)
+        else:
+            sim = Simulation(handler.fread(path)[args.frame], args.seed)
+    except (OSError, ValueError, IndexError) as e:
+        return fail("could not read "+args.config+": "+str(e))
+    for name, value in changes.items():
+        setattr(sim, name, value)
+    steps = args.steps
+    if args.command == "resume":
+        steps = max(0, steps - sim.steps)
+    if args.checkpoint is not None:
+        checkpoints = checkpoint.Checkpointer(args.checkpoint, args.checkpoint_every, args.checkpoint_seconds)
+        sim.observers.append(checkpoints.check)
+    publisher = None
+    if args.stream is not None:
+        import stream
+        try:
+            publisher = stream.Publisher(args.stream, args.stream_rate)
+        except (OSError, ValueError) as e:
+            return fail("could not publish on "+args.stream+": "+str(e))
+        sim.observers.append(publisher.publish)
+
+    frames = None
+    if args.out is not None and args.every:
+        from history import History
+        frames = History()
+        frames.record(sim)
+    screen = None
+    if args.render:
+        import pygame
+        from render import Renderer
+        pygame.init()
+        screen = pygame.display.set_mode((sim.size, sim.size))
+        pygame.display.set_caption("gravi "+os.path.basename(args.config))
+        renderer = Renderer()
+
+    code = OK
+    done = 0
+    # Ctrl+C stops the run after the step it lands in, so what is saved is a whole
+    # step; a second one stops at once and nothing is saved
+    stop = []
+    torn = False
+    def interrupt(signum, frame):
+        if stop:
+            raise KeyboardInterrupt
+        stop.append(signum)
+    previous = signal.signal(signal.SIGINT, interrupt)
+    start = last = time.perf_counter()
+    try:
+        while done < steps and not stop:
+            sim.step()
+            done += 1
+            if frames is not None and done % args.every == 0:
+                frames.record(sim)
+            if screen is not None:
+                if pygame.event.peek(pygame.QUIT):
+                    code = INTERRUPTED
+                    break
+                pygame.event.pump()
+                renderer.draw(screen, sim)
+            if args.progress and time.perf_counter() - last >= args.progress:
+                last = time.perf_counter()
+                progress(sim, done, steps, last - start)
+    except KeyboardInterrupt:
+        torn = True
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    if stop or torn:
+        code = INTERRUPTED
+    seconds = time.perf_counter() - start
+    if screen is not None:
+        pygame.quit()
+    if publisher is not None:
+        publisher.close()
+    if not (np.isfinite(sim.dynamics.pos).all() and np.isfinite(sim.dynamics.vel).all()):
+        code = UNSTABLE
+
+    if torn:
+        return fail("stopped in the middle of a step, nothing saved", INTERRUPTED)
+    if args.checkpoint is not None:
+        try:
+            checkpoints.save(sim)
+        except OSError as e:
+            return fail("could not save "+args.checkpoint+": "+str(e))
+    if args.out is not None:
+        if frames is None:
+            frames = [sim.config()]
+        elif done % args.every:
+            frames.record(sim)
+        try:
+            handler.fwrite(frames, args.out)
+        except OSError as e:
+            return fail("could not save "+args.out+": "+str(e))
+    summary = {
+        "config": args.config,
+        "steps": done,
+        "step": sim.steps,
+        "time": sim.time,
+        "seconds": seconds,
+        "steps_per_second": done/seconds if seconds > 0 else 0.0,
+        "static_bodies": len(sim.statics),
+        "dynamic_bodies": len(sim.dynamics),
+        "removed": sim.removed,
+        "exit": code,
+    }
+    if args.json:
+        print(json.dumps(summary))
+    elif not args.quiet:
+        print(done, "steps in", str(round(seconds, 2))+"s ("+str(round(summary["steps_per_second"], 1))+" steps/s),", sim)
+    return code
+
+COMMANDS = {"run": run, "resume": run}
+
+def options(p):
+    # Options shared by run and resume
+    p.add_argument("settings", nargs="*", help="settings to change before running, e.g. g_const=2.4 sim_mode=2")
+    p.add_argument("--out", help="file to save the result to (.txt or .bin)")
+    p.add_argument("--every", type=int, default=0, help="also save every n-th step to --out, not only the last one")
+    p.add_argument("--integrator", help="euler, leapfrog, yoshida or block")
+    p.add_argument("--backend", help="force solver: direct, tree or mesh")
+    p.add_argument("--workers", type=int, help="threads used for the forces")
+    p.add_argument("--checkpoint-every", type=int, default=0, help="save the checkpoint every n steps")
+    p.add_argument("--checkpoint-seconds", type=float, default=0, help="save the checkpoint every this many seconds")
+    p.add_argument("--stream", metavar="ADDRESS", help="publish frames to viewers (python stream.py) on host:port or a Unix socket path")
+    p.add_argument("--stream-rate", type=float, default=30, help="most frames published per second (Default: 30)")
+    p.add_argument("--progress", type=float, default=0, help="print progress to stderr every this many seconds")
+    p.add_argument("--json", action="store_true", help="print a summary of the run as JSON")
+    p.add_argument("--quiet", action="store_true", help="print nothing unless something goes wrong")
+    p.add_argument("--render", action="store_true", help="show the simulation in a window while it runs (needs pygame)")
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog="gravi", description="Run gravity simulations without a window.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("run", help="run a saved simulation for a number of steps")
+    p.add_argument("config", help="saved simulation (.txt or .bin) or checkpoint, as a path or a name in configs/")
+    p.add_argument("--steps", type=int, default=1000, help="steps to run (Default: 1000)")
+    p.add_argument("--frame", type=int, default=-1, help="frame of the file to start from (Default: the last one)")
+    p.add_argument("--seed", type=int, help="seed of the simulation's random numbers (Default: a random one)")
+    p.add_argument("--checkpoint", help="file to keep a checkpoint of the run in, saved at the end and as often as asked below")
+    options(p)
+    p = commands.add_parser("resume", help="continue a run from its checkpoint until it reaches a step")
+    p.add_argument("config", help="checkpoint saved by run --checkpoint, which keeps being updated")
+    p.add_argument("--steps", type=int, required=True, help="step to stop at, counted from the start of the first run")
+    options(p)
+    args = parser.parse_args(argv)
+    return COMMANDS[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# Imports
+import numpy as np
+import parallel
+
+# Number of pair interactions evaluated per block; keeps temporaries around 8 MB each
+BLOCK = 1 << 20
+# Most targets in one block, so large simulations split into blocks for every worker
+ROWS = 256
+
+def block_rows(n_sources):
+    return max(1, min(ROWS, BLOCK // max(1, n_sources)))
+
+def direct(tpos, tradius, spos, smass, sradius, g_const, workers = 1):
+    # Acceleration of every target from every source. Pairs that touch
+    # (d < r1 + r2), including a body with itself, exert no force.
+    acc = np.zeros((len(tpos), 2))
+    if len(tpos) == 0 or len(spos) == 0:
+        return acc
+    sx, sy = spos[:, 0], spos[:, 1]
+    gm = g_const*smass
+
+    def block(i, j):
+        dx = sx - tpos[i:j, 0, None]
+        dy = sy - tpos[i:j, 1, None]
+        d2 = dx*dx + dy*dy
+        d = np.sqrt(d2)
+        far = (d >= tradius[i:j, None] + sradius) & (d > 0)
+        w = np.divide(gm, d2*d, out=np.zeros_like(d), where=far)
+        acc[i:j, 0] = (w*dx).sum(axis=1)
+        acc[i:j, 1] = (w*dy).sum(axis=1)
+
+    parallel.blocks(block, len(tpos), block_rows(len(spos)), workers)
+    return acc
+
+def expand(first, count):
+    # Concatenation of the ranges [first[i], first[i] + count[i]) and the range each item came from
+    owner = np.repeat(np.arange(len(first)), count)
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(count) - count, count)
+    return owner, first[owner] + offset
+
+def errors(reference, approx):
+    # Relative error of approximate accelerations against a reference solution
+    ref = np.sqrt((reference**2).sum(axis=1))
+    err = np.sqrt(((approx - reference)**2).sum(axis=1))
+    rel = np.divide(err, ref, out=np.zeros_like(err), where=ref > 0)
+    if len(rel) == 0:
+        return {"max": 0.0, "mean": 0.0, "rms": 0.0}
+    return {"max": float(rel.max()), "mean": float(rel.mean()), "rms": float(np.sqrt((rel**2).mean()))}
+
+def potential(tpos, tmass, tradius, spos, smass, sradius, g_const):
+    # Potential energy of each target with every source. Touching bodies feel no
+    # force, so their potential is flat at the contact distance.
+    energy = np.zeros(len(tpos))
+    if len(tpos) == 0 or len(spos) == 0:
+        return energy
+    rows = block_rows(len(spos))
+    for i in range(0, len(tpos), rows):
+        j = min(i + rows, len(tpos))
+        dx = spos[:, 0] - tpos[i:j, 0, None]
+        dy = spos[:, 1] - tpos[i:j, 1, None]
+        d = np.sqrt(dx*dx + dy*dy)
+        r = np.maximum(d, tradius[i:j, None] + sradius)
+        e = np.divide(smass, r, out=np.zeros_like(r), where=d > 0)
+        energy[i:j] = -g_const*tmass[i:j]*e.sum(axis=1)
+    return energy
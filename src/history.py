@@ -0,0 +1,204 @@
+# Imports
+import pickle
+import threading
+import tempfile
+from collections import OrderedDict
+import numpy as np
+from config import Configuration
+
+# Spilled entries kept in memory after being read back from disk
+CACHE = 8
+
+class Snapshot:
+
+    # Read-only rows of one body store: either a full copy (a keyframe) or only the
+    # rows appended on top of an earlier snapshot
+    def __init__(self, rows, parent = None):
+        rows.flags.writeable = False
+        self.rows = rows
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.n = len(rows) + (0 if parent is None else parent.n)
+
+    # Methods
+    def array(self):
+        if self.parent is None:
+            return self.rows
+        return np.concatenate((self.parent.array(), self.rows))
+
+    def nbytes(self):
+        return self.rows.nbytes
+
+
+class History:
+
+    # Undo history. Each entry only stores what changed since the entry before it:
+    # unchanged bodies and settings are shared, bodies added while the simulation
+    # was not running are stored as appended rows, and anything else as a new
+    # keyframe. Delta chains are at most `keyframe` long, so undo is O(N).
+    # Once the snapshots in memory take more than `budget` bytes, the oldest
+    # entries are written to a segment file and read back when needed. configs,
+    # e.g. the frames of an opened file, come before every recorded entry and are
+    # only read when needed.
+    def __init__(self, configs = None, keyframe = 32, budget = 64*2**20):
+        self.base = [] if configs is None else configs
+        self.keyframe = keyframe
+        self.budget = budget
+        self.entries = []
+        self.spilled = []
+        self.segment = None
+        self.cache = OrderedDict()
+        self.bytes = 0
+        self._refs = {}
+        self._marks = {}
+        self._frozen = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.base) + len(self.spilled) + len(self.entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("history index out of range")
+        if i < len(self.base):
+            return self.base[i]
+        i -= len(self.base)
+        if i < len(self.spilled):
+            static, dynamic, settings = self._load(i)
+            return Configuration(static, dynamic, list(settings))
+        static, dynamic, settings = self.entries[i - len(self.spilled)]
+        return Configuration(static.array(), dynamic.array(), list(settings))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, config):
+        static, dynamic = config.arrays()
+        self._push((Snapshot(static.copy()), Snapshot(dynamic.copy()), tuple(config.settings)))
+        self._marks = {}
+
+    def record(self, sim):
+        static = self._snapshot("static", sim.statics, sim.statics.static_array, None)
+        dynamic = self._snapshot("dynamic", sim.dynamics, sim.dynamics.dynamic_array, sim.steps)
+        settings = tuple(sim.settings())
+        if self.entries and self.entries[-1][2] == settings:
+            settings = self.entries[-1][2]
+        self._push((static, dynamic, settings))
+
+    def pop(self):
+        config = self[-1]
+        if self.entries:
+            self._release(self.entries.pop())
+        elif self.spilled:
+            offset, length = self.spilled.pop()
+            self.cache.pop(len(self.spilled), None)
+            # frozen copies may still read the entry
+            if not self._frozen:
+                with self._lock:
+                    self.segment.truncate(offset)
+        else:
+            self.base.pop()
+        self._marks = {}
+        for frozen in self._frozen:
+            frozen.common = min(frozen.common, len(self))
+        return config
+
+    def freeze(self):
+        # A copy of the history as it is now that later records and undos do not
+        # change, sharing all snapshots with it, to be saved on another thread. Until
+        # it is closed, its `common` is the number of entries both still have in common.
+        frozen = History.__new__(History)
+        frozen.__dict__.update(self.__dict__)
+        frozen.base = self.base[:]
+        frozen.entries = self.entries[:]
+        frozen.spilled = self.spilled[:]
+        frozen.cache = OrderedDict()
+        frozen.common = len(self)
+        frozen.parent = self
+        self._frozen.append(frozen)
+        return frozen
+
+    def close(self):
+        # Ends a frozen copy (called from the thread that owns the history)
+        self.parent._frozen.remove(self)
+
+    def nbytes(self):
+        return self.bytes
+
+    # Memory accounting: snapshots are counted once however many entries share them
+    def _push(self, entry):
+        self.entries.append(entry)
+        self._hold(entry[0])
+        self._hold(entry[1])
+        while self.bytes > self.budget and len(self.entries) > 1:
+            self._spill()
+
+    def _release(self, entry):
+        self._drop(entry[0])
+        self._drop(entry[1])
+
+    def _hold(self, snapshot):
+        ref = self._refs.get(id(snapshot))
+        if ref is not None:
+            ref[1] += 1
+            return
+        self._refs[id(snapshot)] = [snapshot, 1]
+        self.bytes += snapshot.nbytes()
+        if snapshot.parent is not None:
+            self._hold(snapshot.parent)
+
+    def _drop(self, snapshot):
+        ref = self._refs[id(snapshot)]
+        ref[1] -= 1
+        if ref[1] == 0:
+            del self._refs[id(snapshot)]
+            self.bytes -= snapshot.nbytes()
+            if snapshot.parent is not None:
+                self._drop(snapshot.parent)
+
+    # Segment file
+    def _spill(self):
+        entry = self.entries.pop(0)
+        if self.segment is None:
+            self.segment = tempfile.TemporaryFile()
+        data = pickle.dumps((entry[0].array(), entry[1].array(), entry[2]), pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.segment.seek(0, 2)
+            self.spilled.append((self.segment.tell(), len(data)))
+            self.segment.write(data)
+        self._release(entry)
+
+    def _load(self, i):
+        if i in self.cache:
+            self.cache.move_to_end(i)
+            return self.cache[i]
+        offset, length = self.spilled[i]
+        with self._lock:
+            self.segment.seek(offset)
+            data = self.segment.read(length)
+        entry = pickle.loads(data)
+        self.cache[i] = entry
+        if len(self.cache) > CACHE:
+            self.cache.popitem(last=False)
+        return entry
+
+    def _snapshot(self, name, store, rows, steps):
+        mark = self._marks.get(name)
+        snapshot = None
+        if mark is not None:
+            version, n, moved, last = mark
+            # nothing but appends since the last snapshot, and no time step in between
+            if moved == steps and store.edited <= version:
+                if store.version == version:
+                    snapshot = last
+                elif last.depth + 1 < self.keyframe:
+                    snapshot = Snapshot(rows(n), last)
+        if snapshot is None:
+            snapshot = Snapshot(rows())
+        self._marks[name] = (store.version, len(store), steps, snapshot)
+        return snapshot
@@ -0,0 +1,91 @@
+# Imports
+import time
+import numpy as np
+
+# Yoshida's fourth order scheme is three leapfrog steps of these relative sizes
+W1 = 1/(2 - 2**(1/3))
+W0 = 1 - 2*W1
+
+def euler(sim, dt):
+    # Semi-implicit Euler, the original scheme: kick with the current force, then drift
+    d = sim.dynamics
+    if sim.gravity:
+        d.vel += sim.update_accelerations(True)*dt
+    d.pos += d.vel*dt
+    sim.moved()
+
+def leapfrog(sim, dt):
+    # Kick-drift-kick; the closing force is kept for the opening kick of the next step
+    d = sim.dynamics
+    if sim.gravity:
+        d.vel += sim.update_accelerations()*dt/2
+    d.pos += d.vel*dt
+    sim.moved()
+    if sim.gravity:
+        d.vel += sim.update_accelerations(True)*dt/2
+
+def yoshida(sim, dt):
+    leapfrog(sim, W1*dt)
+    leapfrog(sim, W0*dt)
+    leapfrog(sim, W1*dt)
+
+def block_levels(sim, dt):
+    # Each body wants a step of eta*sqrt(radius/|a|); it gets the power-of-two
+    # fraction dt/2**level just below that, down to dt/2**max_level
+    d = sim.dynamics
+    a = np.sqrt((sim.update_accelerations()**2).sum(axis=1))
+    wanted = sim.eta*np.sqrt(np.divide(d.radius, a, out=np.full(len(a), np.inf), where=a > 0))
+    ratio = np.divide(dt, wanted, out=np.ones(len(a)), where=wanted > 0)
+    return np.clip(np.ceil(np.log2(np.maximum(ratio, 1))), 0, sim.max_level).astype(np.int64)
+
+def block(sim, dt):
+    # Hierarchical kick-drift-kick: every body is drifted on the finest step in use,
+    # but only kicked, and only has its force recomputed, at the end of its own step
+    d = sim.dynamics
+    if not sim.gravity or len(d) == 0:
+        d.pos += d.vel*dt
+        sim.moved()
+        return
+    level = block_levels(sim, dt)
+    top = int(level.max())
+    substeps = 1 << top
+    h = dt/substeps
+    stride = 1 << (top - level)
+    step = (stride*h)[:, None]
+    for s in range(substeps):
+        start = s % stride == 0
+        d.vel[start] += d.acc[start]*step[start]/2
+        d.pos += d.vel*h
+        end = np.flatnonzero((s + 1) % stride == 0)
+        if len(end) == len(d):
+            d.vel += sim.update_accelerations(True)*step/2
+        else:
+            d.acc[end] = sim.accelerations(targets=end)
+            d.vel[end] += d.acc[end]*step[end]/2
+
+INTEGRATORS = {"euler": euler, "leapfrog": leapfrog, "yoshida": yoshida, "block": block}
+
+def compare(config, duration, time_steps = [0.25, 0.5, 1.0, 2.0]):
+    # Relative energy drift of every integrator over the same simulated time
+    from simulation import Simulation
+    results = []
+    for name in INTEGRATORS:
+        for dt in time_steps:
+            sim = Simulation(config)
+            sim.integrator = name
+            sim.time_step = dt
+            e0 = sim.energy()
+            start = time.perf_counter()
+            sim.step(max(1, round(duration/dt)))
+            seconds = time.perf_counter() - start
+            drift = abs(sim.energy() - e0)/abs(e0) if e0 != 0 else 0.0
+            results.append({"integrator": name, "time_step": dt, "drift": drift, "seconds": seconds, "drift_per_second": drift/seconds})
+    return results
+
+if __name__ == "__main__":
+    import sys
+    import file_handler as fh
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0
+    print("integrator   time step   energy drift   seconds   drift per second")
+    for r in compare(fh.fread(sys.argv[1])[-1], duration):
+        print(r["integrator"], "\t", r["time_step"], "\t", r["drift"], "\t", round(r["seconds"], 4), "\t", r["drift_per_second"])
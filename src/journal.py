@@ -0,0 +1,76 @@
+# Imports
+import os
+import mmap
+import time
+import binary
+
+class Journal:
+
+    # Append-only log kept in a binary simulation file. Every recorded frame and
+    # every undo is appended as one record instead of rewriting the file, and the
+    # file is synced to disk every `sync_every` records or `sync_seconds` seconds.
+    # Reading the file (file_handler.fread) replays the records, so after a crash
+    # the simulation opens as it was at the last sync.
+    def __init__(self, path, sync_every = 32, sync_seconds = 5.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self.file = None
+        self._open()
+
+    # Methods
+    def append(self, config):
+        self.file.write(binary.encode(config))
+        self._written()
+
+    def undo(self):
+        self.file.write(binary.undo())
+        self._written()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.synced = time.monotonic()
+
+    def compact(self):
+        # Rewrite the file with only the frames that were not undone, plus the index
+        self.sync()
+        self.file.close()
+        file = open(self.path, "rb")
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        file.close()
+        starts, ends = binary.index(data)
+        file = open(self.path+".tmp", "wb")
+        binary.write_frames(file, data, starts, ends)
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+        data.close()
+        os.replace(self.path+".tmp", self.path)
+        self._open()
+
+    def close(self, compact = True):
+        if compact:
+            self.compact()
+        self.sync()
+        self.file.close()
+
+    def _open(self):
+        self.file = open(self.path, "ab")
+        size = self.file.seek(0, 2)
+        if size == 0:
+            self.file.write(binary.header())
+        elif size >= binary.HEADER.size + binary.TRAILER.size:
+            # records go where the index of a compacted file starts
+            with open(self.path, "rb") as file:
+                file.seek(size - binary.TRAILER.size)
+                count, tag = binary.TRAILER.unpack(file.read(binary.TRAILER.size))
+            if tag == binary.INDEX_TAG:
+                self.file.truncate(size - binary.TRAILER.size - 8*count)
+        self.sync()
+
+    def _written(self):
+        self.pending += 1
+        if self.pending >= self.sync_every or time.monotonic() - self.synced >= self.sync_seconds:
+            self.sync()
@@ -1,11 +1,13 @@
+import os
 import pygame
 from pygame.locals import *
-from copy import deepcopy
-from math import sqrt, sin, cos, atan2
-from random import random
-from bodies import StaticBody, DynamicBody
-from vector import Vector
-from config import Configuration
+from simulation import Simulation, SOLVERS
+from integrators import INTEGRATORS
+from history import History
+from scheduler import Scheduler
+from render import Renderer
+from recorder import Recorder, Recording
+from writer import Writer
 import file_handler as fh
 
 help = """
@@ -32,21 +34,29 @@ D - Adds random dynamic body to the simulation.
 9 - Deletes all dynamic bodies.
 0 - Deletes all bodies.
 G - Toggle gravity.
+B - Cycle force solver (direct, tree, mesh).
+L - Cycle integrator (euler, leapfrog, yoshida, block).
+F - Cycle physics steps per frame (1, 2, 4, 8, 16).
+V - Toggle performance overlay (time per frame spent on each part of the program).
+X - Profile the next 100 frames (saved to profile.prof).
+C - Start/stop recording the bodies at every step (saved in recordings/).
+E - Replay a recording. (Space: play/pause, Left/Right: one frame, Up/Down: a tenth of the recording, Home/End: first/last frame, E or Esc: back to the simulation)
 W - Toggle wall along the edges of the simulation window.
 T - Toggle tracing (showing object paths).
 R - Refresh (fill window with black, used with tracing).
 S - Save screenshot of current simulation frame.
 Q - Quit program.
+U - Undo the last action.
 
 -- FILES --
-Z - Save current simulation.
+Z - Save current simulation. (End the file name with .bin to save in the binary format.)
 N - Create new simulation.
 O - Open existing simulation.
 Q - Save simulation on quit.
 
 -- ADVANCED --
 P   - Resize window. (Default: 500px)
--/+ - Increase/decrease time step for Euler's method. (Default: 1.0)
+-/+ - Increase/decrease time step of the integrator. (Default: 1.0)
 [/] - Increase/decrease force of gravity between masses. (Default: 1.2)
 </> - Increase/decrease buffer size. (The buffer is the length around simulation window in which objects can stay. Going beyond the buffer removes objects from the simulation. Default: 2000px)
 """
@@ -70,37 +80,15 @@ def input_int(txt, help = "Enter the desired size of your window in pixels.", ma
 
 def save_config():
     global history
-    global static_bodies
-    global dynamic_bodies
-    global size
-    global buffer
-    global sim_mode
-    global cmass
-    global time_step
-    global g_const
-    global wall
-    global gravity
-    global tracing
-    history.append(Configuration(deepcopy(static_bodies), deepcopy(dynamic_bodies[:]), [size, buffer, sim_mode, cmass, time_step, g_const, wall, gravity, tracing]))
+    with stats.phase("history"):
+        history.record(sim)
+        if journal is not None:
+            journal.append(history[-1])
 
 def load_config(config):
-    global static_bodies
-    global dynamic_bodies
     global screen
-    global size
-    global buffer
-    global sim_mode
-    global cmass
-    global time_step
-    global g_const
-    global wall
-    global gravity
-    global tracing
-    contents = config.unpack()
-    static_bodies = contents[0][:]
-    dynamic_bodies = contents[1][:]
-    size, buffer, sim_mode, cmass, time_step, g_const, wall, gravity, tracing = contents[2]
-    screen = pygame.display.set_mode((size, size))
+    sim.load(config)
+    screen = pygame.display.set_mode((sim.size, sim.size))
 
 def save_file():
     global history
@@ -108,20 +96,135 @@ def save_file():
     if cfile == "":
         save = input("Save current simulation? (Press enter to delete current simulation)\nFile name: ").lower()
         if save not in ["", "n", "no", "cancel"]:
-            fh.fwrite(history, save)
+            write_file(save)
             cfile = save
-            print('"'+save+'" saved')
     else:
         save = input("Save current simulation? (Press enter to save changes)\n").lower()
         if save in ["new", "y", "yes"]:
             save = input("File name: ")
         if save not in ["", "n", "no"]:
-            fh.fwrite(history, save)
-            print('"'+save+'" saved')
+            write_file(save)
+
+def write_file(name):
+    # Once saved as .bin, a simulation is journaled: every change is appended to
+    # the file as it happens, so saving it again only has to sync the file.
+    # Otherwise the history is written in the background from a frozen copy.
+    global pending
+    if journal is not None and name.endswith(".bin") and journal.path == fh.fpath(name):
+        journal.sync()
+        print('"'+name+'" saved')
+        return
+    close_journal()
+    frozen = history.freeze()
+    pending = name if name.endswith(".bin") else None
+    writer.submit('"'+name+'"', fh.fwrite, frozen, name, done = lambda ok: file_written(name, frozen, ok))
+
+def file_written(name, frozen, ok):
+    # Called once a background save is done. A .bin file (if it is the latest save)
+    # becomes the journal, catching up with the undos and actions since the copy.
+    global journal
+    global pending
+    frozen.close()
+    if not ok or name != pending:
+        return
+    pending = None
+    close_journal()
+    journal = fh.fjournal(name)
+    for i in range(len(frozen) - frozen.common):
+        journal.undo()
+    for config in history[frozen.common:]:
+        journal.append(config)
+
+def close_journal():
+    global journal
+    if journal is not None:
+        journal.close()
+        journal = None
+
+def toggle_recording():
+    global recorder
+    if recorder is not None:
+        close_recorder()
+        return
+    name = input("Recording name: ")
+    os.makedirs(recdir, exist_ok = True)
+    bodies = len(sim.statics) + len(sim.dynamics)
+    recorder = Recorder(recdir+name+".rec", record_frames, max(1024, 2*bodies), record_every)
+    sim.observers.append(recorder.record)
+    print("Recording to", recorder.path)
+
+def close_recorder():
+    global recorder
+    if recorder is not None:
+        sim.observers.remove(recorder.record)
+        frames = len(recorder)
+        recorder.close()
+        print("Recording saved to", recorder.path, "("+str(frames)+" frames)")
+        recorder = None
+
+def replay():
+    # Plays a recording back through the renderer, without simulating anything
+    files = sorted(os.listdir(recdir)) if os.path.isdir(recdir) else []
+    if not files:
+        print("No recordings in", recdir)
+        return
+    for i in range(len(files)):
+        print(i, files[i])
+    choice = input_int("File index (number): ",
+                       "Enter the index (number on the left) of your desired file from the list above.",
+                       len(files)-1)
+    recording = Recording(recdir+files[choice])
+    if len(recording) == 0:
+        print("Empty recording")
+        return
+    print("Replaying", files[choice], "("+str(len(recording))+" frames)")
+    view = Simulation()
+    i = 0
+    playing = True
+    while 1:
+        for event in (pygame.event.get() if playing else wait_events()):
+            if event.type == pygame.QUIT:
+                exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key in [pygame.K_e, pygame.K_ESCAPE]:
+                    renderer.clear()
+                    print("Replay ended")
+                    return
+                if event.key == pygame.K_SPACE:
+                    playing = not playing
+                if event.key == pygame.K_RIGHT:
+                    i += 1
+                if event.key == pygame.K_LEFT:
+                    i -= 1
+                if event.key == pygame.K_UP:
+                    i += max(1, len(recording)//10)
+                if event.key == pygame.K_DOWN:
+                    i -= max(1, len(recording)//10)
+                if event.key == pygame.K_HOME:
+                    i = 0
+                if event.key == pygame.K_END:
+                    i = len(recording)-1
+                i = min(max(i, 0), len(recording)-1)
+        view.load(recording[i])
+        view.tracing = sim.tracing
+        step, time = recording.info(i)
+        renderer.draw(screen, view, ["Replay "+str(i+1)+"/"+str(len(recording)), "Step "+str(step)+", time "+str(time)])
+        scheduler.tick()
+        if playing:
+            if i < len(recording)-1:
+                i += 1
+            else:
+                playing = False
+
+def wait_events():
+    # Blocks until there is an event instead of polling, so waiting uses no CPU
+    events = [pygame.event.wait()] + pygame.event.get()
+    writer.report()
+    return events
 
 def on_click():
     while 1:
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 exit()
             if event.type == pygame.MOUSEBUTTONUP:
@@ -130,28 +233,16 @@ def on_click():
 def on_pause():
     global cfile
     global screen
-    global size
-    global buffer
     global history
-    global static_bodies
-    global dynamic_bodies
-    global sim_mode
-    global cmass
-    global time_step
-    global g_const
-    global wall
-    global gravity
-    global tracing
     while 1:
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 exit()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 3:
                     save_config()
-                    new_body = StaticBody(cmass, on_click())
-                    static_bodies.append(new_body)
+                    new_body = sim.add_static(sim.cmass, on_click())
                     print("Static body added:", str(new_body))
                     pygame.draw.circle(screen, (255,255,255), round(new_body.pos).list(), new_body.radius)
                     pygame.display.flip()
@@ -159,18 +250,17 @@ def on_pause():
                     save_config()
                     initial = pygame.mouse.get_pos()
                     final = on_click()
-                    new_body = DynamicBody(cmass, initial, [(final[0]-initial[0])/300, (final[1]-initial[1])/300])
-                    dynamic_bodies.append(new_body)
+                    new_body = sim.add_dynamic(sim.cmass, initial, [(final[0]-initial[0])/300, (final[1]-initial[1])/300])
                     print("Dynamic body added:", str(new_body))
                     pygame.draw.circle(screen, (255,255,255), round(new_body.pos).list(), new_body.radius)
                     pygame.display.flip()
                 if event.button == 5:
-                    if cmass >= 0.4:
-                        cmass -= 0.2
-                    print("Current mass:",cmass)
+                    if sim.cmass >= 0.4:
+                        sim.cmass -= 0.2
+                    print("Current mass:",sim.cmass)
                 if event.button == 4:
-                    cmass += 0.2
-                    print("Current mass:",cmass)
+                    sim.cmass += 0.2
+                    print("Current mass:",sim.cmass)
 
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
@@ -178,51 +268,70 @@ def on_pause():
                     return
                 save_config()
                 if event.key == pygame.K_1:
-                    sim_mode = 1
+                    sim.sim_mode = 1
                     print("Simulation mode: 1 (No collisions)")
                 if event.key == pygame.K_2:
-                    sim_mode = 2
+                    sim.sim_mode = 2
                     print("Simulation mode: 2 (Combining objects)")
                 if event.key == pygame.K_7:
-                    for body in dynamic_bodies:
-                        body.vel = Vector([0, 0])
+                    sim.halt()
                     print("All dynamic bodies stopped")
                 if event.key == pygame.K_8:
-                    static_bodies = []
+                    sim.clear_static()
                     print("Static bodies cleared")
                 if event.key == pygame.K_9:
-                    dynamic_bodies = []
+                    sim.clear_dynamic()
                     print("Dynamic bodies cleared")
                 if event.key == pygame.K_0:
-                    static_bodies = []
-                    dynamic_bodies = []
+                    sim.clear_static()
+                    sim.clear_dynamic()
                     print("All bodies cleared")
 
                 if event.key == pygame.K_EQUALS:
-                    time_step *= 2
-                    print("Time step:", time_step)
+                    sim.time_step *= 2
+                    print("Time step:", sim.time_step)
                 if event.key == pygame.K_MINUS:
-                    time_step /= 2
-                    print("Time step:", time_step)
+                    sim.time_step /= 2
+                    print("Time step:", sim.time_step)
                 if event.key == pygame.K_RIGHTBRACKET:
-                    g_const *= 1.2
-                    print("Gravitational Constant:", g_const)
+                    sim.g_const *= 1.2
+                    print("Gravitational Constant:", sim.g_const)
                 if event.key == pygame.K_LEFTBRACKET:
-                    g_const /= 1.2
-                    print("Gravitational Constant:", g_const)
+                    sim.g_const /= 1.2
+                    print("Gravitational Constant:", sim.g_const)
                 if event.key == pygame.K_COMMA:
-                    if buffer >= 100:
-                        buffer -= 100
-                    print("Buffer:", buffer)
+                    if sim.buffer >= 100:
+                        sim.buffer -= 100
+                    print("Buffer:", sim.buffer)
                 if event.key == pygame.K_PERIOD:
-                    buffer += 100
-                    print("Buffer:", buffer)
+                    sim.buffer += 100
+                    print("Buffer:", sim.buffer)
 
                 if event.key == pygame.K_d:
-                    dynamic_bodies.append(DynamicBody(cmass, [size/4+random()*size/2, size/4+random()*size/2], [(random()*size-size/2)/800, (random()*size - size/2)/800]))
+                    sim.add_random()
                 if event.key == pygame.K_g:
-                    gravity = not gravity
-                    print("Gravity:", gravity)
+                    sim.gravity = not sim.gravity
+                    print("Gravity:", sim.gravity)
+                if event.key == pygame.K_b:
+                    sim.solver = SOLVERS[(SOLVERS.index(sim.solver)+1) % len(SOLVERS)]
+                    print("Solver:", sim.solver)
+                if event.key == pygame.K_l:
+                    names = list(INTEGRATORS)
+                    sim.integrator = names[(names.index(sim.integrator)+1) % len(names)]
+                    print("Integrator:", sim.integrator)
+                if event.key == pygame.K_f:
+                    scheduler.substeps = scheduler.substeps*2 if scheduler.substeps < 16 else 1
+                    print("Steps per frame:", scheduler.substeps)
+                if event.key == pygame.K_v:
+                    stats.toggle()
+                    print("Performance overlay:", stats.enabled)
+                if event.key == pygame.K_x:
+                    stats.profile(100, "profile.prof")
+                    print("Profiling the next 100 frames")
+                if event.key == pygame.K_c:
+                    toggle_recording()
+                if event.key == pygame.K_e:
+                    replay()
                 if event.key == pygame.K_y:
                     print("--- HISTORY ---")
                     for i in range(len(history)):
@@ -231,102 +340,123 @@ def on_pause():
                     print(help)
                 if event.key == pygame.K_i:
                     print("--- INFORMATION MENU ---")
-                    print("Display size:", size)
-                    print("Buffer:", buffer)
-                    print("Simulation mode:", sim_mode)
-                    print("Current mass:", cmass)
-                    print("Time step:", time_step)
-                    print("Gravitational Constant:", g_const)
-                    print("Wall:", wall)
-                    print("Gravity:", gravity)
-                    print("Tracing:", tracing)
+                    print("Display size:", sim.size)
+                    print("Buffer:", sim.buffer)
+                    print("Simulation mode:", sim.sim_mode)
+                    print("Current mass:", sim.cmass)
+                    print("Time step:", sim.time_step)
+                    print("Gravitational Constant:", sim.g_const)
+                    print("Wall:", sim.wall)
+                    print("Gravity:", sim.gravity)
+                    print("Tracing:", sim.tracing)
+                    print("Solver:", sim.solver)
+                    print("Opening angle:", sim.theta)
+                    print("Mesh:", sim.mesh_size, "x", sim.mesh_size, "padded", sim.mesh_pad, "times")
+                    print("Integrator:", sim.integrator)
+                    print("Workers:", sim.workers)
+                    print("Static field:", sim.static_field)
+                    print("Seed:", sim.seed)
+                    print("Steps per frame:", scheduler.substeps)
+                    print("Frame rate:", round(scheduler.clock.get_fps(), 1))
+                    print("Performance:", "on" if stats.enabled else "off (V to turn on)")
+                    for line in stats.lines():
+                        print("\t", line)
                     print("Static bodies:")
-                    for body in static_bodies:
+                    for body in sim.static_bodies:
                         print("\t", body.mass, body.pos)
                     print("Dynamic bodies:")
-                    for body in dynamic_bodies:
+                    for body in sim.dynamic_bodies:
                         print("\t", body.mass, body.pos, body.vel, body.acc)
                 if event.key == pygame.K_n:
                     print("NEW SIMULATION")
                     save_file()
 
-                    static_bodies = []
-                    dynamic_bodies = []
-                    cmass = 3
-                    time_step = 1
-                    g_const = 2.0
-                    sim_mode = 1
-                    wall = True
-                    gravity = True
-                    tracing = False
+                    sim.clear_static()
+                    sim.clear_dynamic()
+                    sim.cmass = 3
+                    sim.time_step = 1
+                    sim.g_const = 2.0
+                    sim.sim_mode = 1
+                    sim.wall = True
+                    sim.gravity = True
+                    sim.tracing = False
                     print("New simulation created")
                     return
                 if event.key == pygame.K_o:
                     print("--- OPENING SIMULATION ---")
                     save_file()
+                    writer.wait()
                     files = fh.fdir()
                     for i in range(len(files)):
                         print(i, files[i])
                     choice = input_int("File index (number): ",
                                        "Enter the index (number on the left) of your desired file from the list above.",
                                        len(files))
+                    close_journal()
                     cfile = files[choice]
-                    history = fh.fread(cfile)
+                    history = History(fh.fread(cfile), budget = history_budget)
                     if len(history) > 0:
                         load_config(history.pop())
                     else:
-                        static_bodies = []
-                        dynamic_bodies = []
-
-                        cmass = 3
-                        time_step = 1
-                        g_const = 2.0
-                        sim_mode = 1
-                        wall = True
-                        gravity = True
-                        tracing = False
+                        sim.clear_static()
+                        sim.clear_dynamic()
+
+                        sim.cmass = 3
+                        sim.time_step = 1
+                        sim.g_const = 2.0
+                        sim.sim_mode = 1
+                        sim.wall = True
+                        sim.gravity = True
+                        sim.tracing = False
                     print("Simulation", cfile, "loaded")
                     return
                 if event.key == pygame.K_p:
-                    size = input_int("Resize window: ")
-                    screen = pygame.display.set_mode((size, size))
+                    sim.size = input_int("Resize window: ")
+                    screen = pygame.display.set_mode((sim.size, sim.size))
                     print("Window resized")
                 if event.key == pygame.K_q:
                     confirm = input("Are you sure you want to quit?\n")
                     if confirm not in ["y", "yes", "exit", "quit", "q"]:
                         continue
                     save_file()
+                    writer.wait()
+                    close_journal()
+                    close_recorder()
                     exit()
                 if event.key == pygame.K_s:
                     sname = input("Screenshot name: ")
-                    pygame.image.save(screen, "screenshots/"+sname+".jpeg")
-                    print(sname, "saved")
+                    writer.submit(sname, pygame.image.save, screen.copy(), "screenshots/"+sname+".jpeg")
                 if event.key == pygame.K_t:
-                    tracing = not tracing
-                    print("Tracing:", tracing)
+                    sim.tracing = not sim.tracing
+                    print("Tracing:", sim.tracing)
                 if event.key == pygame.K_w:
-                    wall = not wall
-                    print("Wall:", wall)
+                    sim.wall = not sim.wall
+                    print("Wall:", sim.wall)
                 if event.key == pygame.K_z:
                     save_file()
 
 cfile = ""
-size = 500
-buffer = 2000
+journal = None
+pending = None
+# Seed of the random bodies added with D (None: a different one every session)
+seed = None
+sim = Simulation(seed = seed)
+stats = sim.stats
 pygame.init()
-screen = pygame.display.set_mode((size, size))
-
-history = []
-static_bodies = []
-dynamic_bodies = []
-
-cmass = 3.0
-time_step = 1.0
-g_const = 1.2
-sim_mode = 1
-wall = True
-gravity = True
-tracing = False
+screen = pygame.display.set_mode((sim.size, sim.size))
+
+history_budget = 64*2**20
+history = History(budget = history_budget)
+# Frames per second, physics steps per frame, and simulated time per real second (0: use steps per frame)
+scheduler = Scheduler(fps = 60, substeps = 1, rate = 0)
+renderer = Renderer()
+# Saves and screenshots are written in the background; finishing one wakes up the pause loop
+writer = Writer(notify = lambda: pygame.event.post(pygame.event.Event(pygame.USEREVENT)))
+# Trajectory recordings: folder, frames kept (older ones are overwritten) and steps between frames
+recdir = "recordings/"
+recorder = None
+record_frames = 10000
+record_every = 1
 while 1:
 
     for event in pygame.event.get():
@@ -336,78 +466,101 @@ while 1:
         if event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 3:
                 save_config()
-                static_bodies.append(StaticBody(cmass, on_click()))
-                print("Static body added:", str(static_bodies[-1]))
+                new_body = sim.add_static(sim.cmass, on_click())
+                print("Static body added:", str(new_body))
             if event.button == 1:
                 save_config()
                 initial = pygame.mouse.get_pos()
                 final = on_click()
-                dynamic_bodies.append(DynamicBody(cmass, initial, [(final[0]-initial[0])/300, (final[1]-initial[1])/300]))
-                print("Dynamic body added:", str(dynamic_bodies[-1]))
+                new_body = sim.add_dynamic(sim.cmass, initial, [(final[0]-initial[0])/300, (final[1]-initial[1])/300])
+                print("Dynamic body added:", str(new_body))
             if event.button == 5:
-                if cmass >= 0.4:
-                    cmass -= 0.2
-                print("Current mass:",cmass)
+                if sim.cmass >= 0.4:
+                    sim.cmass -= 0.2
+                print("Current mass:",sim.cmass)
             if event.button == 4:
-                cmass += 0.2
-                print("Current mass:",cmass)
+                sim.cmass += 0.2
+                print("Current mass:",sim.cmass)
 
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_u:
                 if len(history) > 0:
                     load_config(history.pop())
+                    if journal is not None:
+                        journal.undo()
                     print("Undo")
                     continue
             if event.key == pygame.K_SPACE:
                 print("Paused")
                 on_pause()
+                # bodies added while paused were drawn past the renderer
+                renderer.full = True
             save_config()
             if event.key == pygame.K_1:
-                sim_mode = 1
+                sim.sim_mode = 1
                 print("Simulation mode: 1 (No collisions)")
             if event.key == pygame.K_2:
-                sim_mode = 2
+                sim.sim_mode = 2
                 print("Simulation mode: 2 (Combining objects)")
             if event.key == pygame.K_7:
-                for body in dynamic_bodies:
-                    body.vel = Vector([0, 0])
+                sim.halt()
                 print("All dynamic bodies stopped")
             if event.key == pygame.K_8:
-                static_bodies = []
+                sim.clear_static()
                 print("Static bodies cleared")
             if event.key == pygame.K_9:
-                dynamic_bodies = []
+                sim.clear_dynamic()
                 print("Dynamic bodies cleared")
             if event.key == pygame.K_0:
-                static_bodies = []
-                dynamic_bodies = []
+                sim.clear_static()
+                sim.clear_dynamic()
                 print("All bodies cleared")
 
             if event.key == pygame.K_EQUALS:
-                time_step *= 2
-                print("Time step:", time_step)
+                sim.time_step *= 2
+                print("Time step:", sim.time_step)
             if event.key == pygame.K_MINUS:
-                time_step /= 2
-                print("Time step:", time_step)
+                sim.time_step /= 2
+                print("Time step:", sim.time_step)
             if event.key == pygame.K_RIGHTBRACKET:
-                g_const *= 1.2
-                print("Gravitational Constant:", g_const)
+                sim.g_const *= 1.2
+                print("Gravitational Constant:", sim.g_const)
             if event.key == pygame.K_LEFTBRACKET:
-                g_const /= 1.2
-                print("Gravitational Constant:", g_const)
+                sim.g_const /= 1.2
+                print("Gravitational Constant:", sim.g_const)
             if event.key == pygame.K_COMMA:
-                if buffer >= 100:
-                    buffer -= 100
-                print("Buffer:", buffer)
+                if sim.buffer >= 100:
+                    sim.buffer -= 100
+                print("Buffer:", sim.buffer)
             if event.key == pygame.K_PERIOD:
-                buffer += 100
-                print("Buffer:", buffer)
+                sim.buffer += 100
+                print("Buffer:", sim.buffer)
 
             if event.key == pygame.K_d:
-                dynamic_bodies.append(DynamicBody(cmass, [size/4+random()*size/2, size/4+random()*size/2], [(random()*size-size/2)/800, (random()*size - size/2)/800]))
+                sim.add_random()
             if event.key == pygame.K_g:
-                gravity = not gravity
-                print("Gravity:", gravity)
+                sim.gravity = not sim.gravity
+                print("Gravity:", sim.gravity)
+            if event.key == pygame.K_b:
+                sim.solver = SOLVERS[(SOLVERS.index(sim.solver)+1) % len(SOLVERS)]
+                print("Solver:", sim.solver)
+            if event.key == pygame.K_l:
+                names = list(INTEGRATORS)
+                sim.integrator = names[(names.index(sim.integrator)+1) % len(names)]
+                print("Integrator:", sim.integrator)
+            if event.key == pygame.K_f:
+                scheduler.substeps = scheduler.substeps*2 if scheduler.substeps < 16 else 1
+                print("Steps per frame:", scheduler.substeps)
+            if event.key == pygame.K_v:
+                stats.toggle()
+                print("Performance overlay:", stats.enabled)
+            if event.key == pygame.K_x:
+                stats.profile(100, "profile.prof")
+                print("Profiling the next 100 frames")
+            if event.key == pygame.K_c:
+                toggle_recording()
+            if event.key == pygame.K_e:
+                replay()
             if event.key == pygame.K_y:
                 print("--- HISTORY ---")
                 for i in range(len(history)):
@@ -416,116 +569,109 @@ while 1:
                 print(help)
             if event.key == pygame.K_i:
                 print("--- INFORMATION MENU ---")
-                print("Display size:", size)
-                print("Buffer:", buffer)
-                print("Simulation mode:", sim_mode)
-                print("Current mass:", cmass)
-                print("Time step:", time_step)
-                print("Gravitational Constant:", g_const)
-                print("Wall:", wall)
-                print("Gravity:", gravity)
-                print("Tracing:", tracing)
+                print("Display size:", sim.size)
+                print("Buffer:", sim.buffer)
+                print("Simulation mode:", sim.sim_mode)
+                print("Current mass:", sim.cmass)
+                print("Time step:", sim.time_step)
+                print("Gravitational Constant:", sim.g_const)
+                print("Wall:", sim.wall)
+                print("Gravity:", sim.gravity)
+                print("Tracing:", sim.tracing)
+                print("Solver:", sim.solver)
+                print("Opening angle:", sim.theta)
+                print("Mesh:", sim.mesh_size, "x", sim.mesh_size, "padded", sim.mesh_pad, "times")
+                print("Integrator:", sim.integrator)
+                print("Workers:", sim.workers)
+                print("Static field:", sim.static_field)
+                print("Seed:", sim.seed)
+                print("Steps per frame:", scheduler.substeps)
+                print("Frame rate:", round(scheduler.clock.get_fps(), 1))
+                print("Performance:", "on" if stats.enabled else "off (V to turn on)")
+                for line in stats.lines():
+                    print("\t", line)
                 print("Static bodies:")
-                for body in static_bodies:
+                for body in sim.static_bodies:
                     print("\t", body.mass, body.pos)
                 print("Dynamic bodies:")
-                for body in dynamic_bodies:
+                for body in sim.dynamic_bodies:
                     print("\t", body.mass, body.pos, body.vel, body.acc)
             if event.key == pygame.K_n:
                 save_file()
-                static_bodies = []
-                dynamic_bodies = []
-                cmass = 3
-                time_step = 1
-                g_const = 2.0
-                sim_mode = 1
-                wall = True
-                gravity = True
-                tracing = False
+                sim.clear_static()
+                sim.clear_dynamic()
+                sim.cmass = 3
+                sim.time_step = 1
+                sim.g_const = 2.0
+                sim.sim_mode = 1
+                sim.wall = True
+                sim.gravity = True
+                sim.tracing = False
                 print("New simulation created")
             if event.key == pygame.K_o:
                 if cfile != "":
                     save_file()
+                writer.wait()
                 files = fh.fdir()
                 for i in range(len(files)):
                     print(i, files[i])
                 choice = input_int("File index (number): ", len(files))
+                close_journal()
                 cfile = files[choice]
-                history = fh.fread(cfile)
+                history = History(fh.fread(cfile), budget = history_budget)
                 if len(history) > 0:
                     load_config(history.pop())
                 else:
-                    static_bodies = []
-                    dynamic_bodies = []
-                    cmass = 3
-                    time_step = 1
-                    g_const = 2.0
-                    sim_mode = 1
-                    wall = True
-                    gravity = True
-                    tracing = False
+                    sim.clear_static()
+                    sim.clear_dynamic()
+                    sim.cmass = 3
+                    sim.time_step = 1
+                    sim.g_const = 2.0
+                    sim.sim_mode = 1
+                    sim.wall = True
+                    sim.gravity = True
+                    sim.tracing = False
                 print("Simulation", cfile, "loaded")
             if event.key == pygame.K_p:
-                size = input_int("Resize window: ")
-                screen = pygame.display.set_mode((size, size))
+                sim.size = input_int("Resize window: ")
+                screen = pygame.display.set_mode((sim.size, sim.size))
                 print("Window resized")
             if event.key == pygame.K_q:
                 confirm = input("Are you sure you want to quit?\n")
                 if confirm not in ["y", "yes", "exit", "quit", "q"]:
                     continue
                 save_file()
+                writer.wait()
+                close_journal()
+                close_recorder()
                 exit()
             if event.key == pygame.K_r:
-                screen.fill((0,0,0))
+                renderer.clear()
                 print("Screen refreshed")
             if event.key == pygame.K_s:
                 sname = input("Screenshot name: ")
-                pygame.image.save(screen, "screenshots/"+sname+".jpeg")
-                print(sname, "saved")
+                writer.submit(sname, pygame.image.save, screen.copy(), "screenshots/"+sname+".jpeg")
             if event.key == pygame.K_t:
-                tracing = not tracing
-                print("Tracing:", tracing)
+                sim.tracing = not sim.tracing
+                print("Tracing:", sim.tracing)
             if event.key == pygame.K_w:
-                wall = not wall
-                print("Wall:", wall)
+                sim.wall = not sim.wall
+                print("Wall:", sim.wall)
             if event.key == pygame.K_z:
                 save_file()
 
-    if not tracing:
-        screen.fill((0,0,0))
-    for body in dynamic_bodies:
-        body.acc = Vector([0, 0])
-        for other in dynamic_bodies+static_bodies:
-            d = body.dist(other)
-            if d == 0:
-                continue
-            elif d < body.radius + other.radius:
-                if sim_mode == 1:
-                    continue
-                elif sim_mode == 2:
-                    other.increase_mass(body.mass)
-                    other.pos = (body.pos*body.mass+other.pos*other.mass)/(body.mass+other.mass)
-                    if other in dynamic_bodies:
-                        other.vel = (body.vel*body.mass+other.vel*other.mass)/(body.mass+other.mass)
-                    dynamic_bodies.remove(body)
-                    continue
-            else:
-                dvec = other.pos - body.pos
-                mag = g_const*other.mass/d**2
-                arg = atan2(dvec.x, dvec.y)
-                body.acc += Vector([mag*sin(arg), mag*cos(arg)])
-        if body.pos.x < -buffer or body.pos.x > size+buffer or body.pos.y < -buffer or body.pos.y > size+buffer:
-            dynamic_bodies.remove(body)
-            print("Body out of range")
-        if wall:
-            if body.pos.x < 0 or body.pos.x > size:
-                body.vel.x = -body.vel.x
-            if body.pos.y < 0 or body.pos.y > size:
-                body.vel.y = -body.vel.y
-        if gravity:
-            body.vel += body.acc * time_step
-        body.pos += body.vel * time_step
-        pygame.draw.circle(screen, (255,255,255), round(body.pos).list(), body.radius)
-    for body in static_bodies:
-        pygame.draw.circle(screen, (255,255,255), round(body.pos).list(), body.radius)
-    pygame.display.flip()
+    writer.report()
+    stats.lap("events")
+    removed = sim.removed
+    sim.step(scheduler.steps(sim.time_step))
+    for i in range(sim.removed - removed):
+        print("Body out of range")
+    stats.lap("physics")
+    if scheduler.draw():
+        renderer.draw(screen, sim, stats.lines())
+    stats.lap("draw")
+    scheduler.tick()
+    stats.lap("wait")
+    stats.gauge("bodies", len(sim.statics) + len(sim.dynamics))
+    stats.gauge("history MB", round(history.nbytes()/2**20, 2))
+    stats.frame()
@@ -0,0 +1,87 @@
+# Imports
+import numpy as np
+
+# Force kernels of a unit mass on padded grids, in grid units, by grid shape
+_kernels = {}
+
+def kernel(m):
+    # Fourier transforms of the x and y force of a unit mass at every offset of an
+    # m x m grid (offsets wrap around). The force falls off as 1/r**2 like direct
+    # summation, and grows linearly inside one cell instead of diverging.
+    if m not in _kernels:
+        o = np.arange(m)
+        o[o > m//2] -= m
+        ox, oy = np.meshgrid(o.astype(float), o.astype(float), indexing="ij")
+        r = np.sqrt(ox*ox + oy*oy)
+        w = 1/np.maximum(r, 1)**3
+        # the offset half way round is both m/2 and -m/2; it must not pull either way
+        w[np.abs(ox) == m/2] = 0
+        w[np.abs(oy) == m/2] = 0
+        # the grid is convolved with it, so offsets are from source to target and
+        # the pull points back along them
+        _kernels[m] = (np.fft.rfft2(-ox*w), np.fft.rfft2(-oy*w))
+    return _kernels[m]
+
+def cloud(pos, lo, h):
+    # Cloud-in-cell: the four grid points around every position and their weights
+    u = (pos - lo)/h
+    i = u.astype(np.int64)
+    f = u - i
+    gx, gy = 1 - f[:, 0], 1 - f[:, 1]
+    points = [(i[:, 0], i[:, 1]), (i[:, 0] + 1, i[:, 1]), (i[:, 0], i[:, 1] + 1), (i[:, 0] + 1, i[:, 1] + 1)]
+    weights = [gx*gy, f[:, 0]*gy, gx*f[:, 1], f[:, 0]*f[:, 1]]
+    return points, weights
+
+def grid(cells, pad):
+    # Points along each side of the padded grid
+    return max(cells, int(np.ceil(cells*pad)))
+
+def work(ntargets, nsources, cells, pad):
+    # Interactions evaluated: every source is spread onto and every target read from
+    # four grid points, and every point of the padded grid is convolved
+    return 4*(ntargets + nsources) + grid(cells, pad)**2
+
+def accelerations(tpos, spos, smass, g_const, cells, pad):
+    # Particle-mesh accelerations: the source masses are spread onto a grid of
+    # cells x cells points over the bodies, convolved with the force kernel by FFT
+    # and interpolated back to the targets. The grid is zero padded to pad times its
+    # size; with pad >= 2 there is no pull from images of the grid, pad = 1 makes it
+    # periodic. Bodies closer than a cell are softened, and touching bodies still pull.
+    acc = np.zeros((len(tpos), 2))
+    if len(tpos) == 0 or len(spos) == 0:
+        return acc
+    both = np.concatenate((tpos, spos))
+    lo = both.min(axis=0)
+    side = float((both.max(axis=0) - lo).max())
+    side = side*(1 + 1e-9) if side > 0 else 1.0
+    h = side/(cells - 1)
+    m = grid(cells, pad)
+
+    points, weights = cloud(spos, lo, h)
+    rho = np.zeros(m*m)
+    for (i, j), w in zip(points, weights):
+        rho += np.bincount(i*m + j, smass*w, m*m)
+    rho = np.fft.rfft2(rho.reshape(m, m))
+    kx, ky = kernel(m)
+    gx = np.fft.irfft2(rho*kx, (m, m)).ravel()
+    gy = np.fft.irfft2(rho*ky, (m, m)).ravel()
+
+    # the same weights as the deposit, so a body does not pull itself
+    points, weights = cloud(tpos, lo, h)
+    for (i, j), w in zip(points, weights):
+        acc[:, 0] += gx[i*m + j]*w
+        acc[:, 1] += gy[i*m + j]*w
+    return acc*(g_const/(h*h))
+
+if __name__ == "__main__":
+    import sys
+    import gravity
+    import file_handler as fh
+    from simulation import Simulation
+    sim = Simulation(fh.fread(sys.argv[1])[-1])
+    reference = sim.accelerations("direct")
+    print("mesh size   max error   rms error")
+    for cells in [64, 128, 256, 512]:
+        sim.mesh_size = cells
+        error = gravity.errors(reference, sim.accelerations("mesh"))
+        print(cells, "\t", error["max"], "\t", error["rms"])
@@ -0,0 +1,22 @@
+# One pool per worker count, shared by every simulation in the process
+_pools = {}
+
+def pool(workers):
+    if workers not in _pools:
+        # imported here so single-threaded runs start without it
+        from concurrent.futures import ThreadPoolExecutor
+        _pools[workers] = ThreadPoolExecutor(workers)
+    return _pools[workers]
+
+def blocks(function, n, size, workers = 1):
+    # Calls function(start, stop) on consecutive blocks of `size` rows covering [0, n).
+    # The blocks are the same for any number of workers and every block writes its own
+    # rows, so the results are identical whichever thread computed them. NumPy releases
+    # the GIL inside its array loops, so the threads run in parallel.
+    ranges = [(i, min(i + size, n)) for i in range(0, n, size)]
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            function(start, stop)
+    else:
+        for result in pool(workers).map(lambda r: function(*r), ranges):
+            pass
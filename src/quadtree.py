@@ -0,0 +1,159 @@
+# Imports
+import numpy as np
+import parallel
+from gravity import expand
+
+# Maximum tree depth; bodies closer than root size / 2**DEPTH share a leaf
+DEPTH = 16
+# Targets walked through the tree at once (the result of a target does not
+# depend on which others share its chunk)
+CHUNK = 1024
+
+def _spread(v):
+    v = v.astype(np.uint64)
+    for shift, mask in [(16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333), (1, 0x5555555555555555)]:
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+def _compact(v):
+    v = v & np.uint64(0x5555555555555555)
+    for shift, mask in [(1, 0x3333333333333333), (2, 0x0F0F0F0F0F0F0F0F), (4, 0x00FF00FF00FF00FF), (8, 0x0000FFFF0000FFFF), (16, 0x00000000FFFFFFFF)]:
+        v = (v | (v >> np.uint64(shift))) & np.uint64(mask)
+    return v
+
+class QuadTree:
+
+    # Constructor
+    def __init__(self, pos, mass, radius):
+        self.n = len(pos)
+        if self.n == 0:
+            return
+        lo = pos.min(axis=0)
+        side = float((pos.max(axis=0) - lo).max())
+        side = side*(1 + 1e-9) if side > 0 else 1.0
+        cells = 1 << DEPTH
+        q = np.clip(((pos - lo)/side*cells).astype(np.int64), 0, cells - 1)
+        code = _spread(q[:, 0]) | (_spread(q[:, 1]) << np.uint64(1))
+        order = np.argsort(code, kind="stable")
+        code = code[order]
+        self.order = order
+        mass = mass[order]
+        radius = radius[order]
+        mx, my = mass*pos[order, 0], mass*pos[order, 1]
+
+        levels = []
+        offset = 0
+        parents = None
+        for level in range(DEPTH + 1):
+            keys = code >> np.uint64(2*(DEPTH - level))
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            ends = np.append(starts[1:], self.n)
+            m = np.add.reduceat(mass, starts)
+            x = np.add.reduceat(mx, starts)
+            y = np.add.reduceat(my, starts)
+            r = np.maximum.reduceat(radius, starts)
+            keys = keys[starts]
+            if parents is not None:
+                # only cells whose parent was opened exist at this level
+                up = keys >> np.uint64(2)
+                idx = np.minimum(np.searchsorted(parents["keys"], up), len(parents["keys"]) - 1)
+                live = parents["keys"][idx] == up
+                keys, starts, ends, m, x, y, r = keys[live], starts[live], ends[live], m[live], x[live], y[live], r[live]
+                up = up[live]
+                left = np.searchsorted(up, parents["keys"], "left")
+                right = np.searchsorted(up, parents["keys"], "right")
+                levels[-1]["first"][parents["index"]] = offset + left
+                levels[-1]["count"][parents["index"]] = right - left
+            leaf = (ends - starts == 1) | (level == DEPTH)
+            size = side/(1 << level)
+            ix = _compact(keys).astype(float)
+            iy = _compact(keys >> np.uint64(1)).astype(float)
+            levels.append({
+                "start": starts, "end": ends, "mass": m,
+                "cx": x/m, "cy": y/m, "radius": r, "size": np.full(len(keys), size),
+                "bx": lo[0] + (ix + 0.5)*size, "by": lo[1] + (iy + 0.5)*size,
+                "leaf": leaf,
+                "first": np.zeros(len(keys), dtype=np.int64),
+                "count": np.zeros(len(keys), dtype=np.int64),
+            })
+            offset += len(keys)
+            if leaf.all():
+                break
+            parents = {"keys": keys[~leaf], "index": np.flatnonzero(~leaf)}
+        for name in levels[0]:
+            setattr(self, name, np.concatenate([l[name] for l in levels]))
+
+    # Methods
+    def accelerations(self, tpos, tradius, spos, smass, sradius, g_const, theta, workers = 1):
+        # self.pairs is set to the number of body pairs and accepted cells evaluated
+        acc = np.zeros((len(tpos), 2))
+        self.pairs = 0
+        if self.n == 0:
+            return acc
+        pairs = []
+
+        def chunk(i, j):
+            acc[i:j], k = self._walk(tpos[i:j], tradius[i:j], spos, smass, sradius, g_const, theta)
+            pairs.append(k)
+
+        parallel.blocks(chunk, len(tpos), CHUNK, workers)
+        self.pairs = sum(pairs)
+        return acc
+
+    def _walk(self, tpos, tradius, spos, smass, sradius, g_const, theta):
+        nt = len(tpos)
+        ax, ay = np.zeros(nt), np.zeros(nt)
+        t = np.arange(nt)
+        node = np.zeros(nt, dtype=np.int64)
+        pairs = 0
+        while len(t):
+            tx, ty = tpos[t, 0], tpos[t, 1]
+            dx, dy = self.cx[node] - tx, self.cy[node] - ty
+            d2 = dx*dx + dy*dy
+            d = np.sqrt(d2)
+            size = self.size[node]
+            leaf = self.leaf[node]
+            # distance to the cell's box, which is 0 for targets inside it
+            ex = np.maximum(np.abs(tx - self.bx[node]) - size/2, 0)
+            ey = np.maximum(np.abs(ty - self.by[node]) - size/2, 0)
+            gap = np.sqrt(ex*ex + ey*ey)
+            # a cell that may hold a body touching the target is opened, so touching
+            # bodies exert no force like in direct summation
+            accept = ~leaf & (gap > 0) & (gap >= tradius[t] + self.radius[node]) & (size < theta*d)
+
+            # far cells act as a single mass at their centre of mass
+            w = g_const*self.mass[node[accept]]/(d2[accept]*d[accept])
+            ax += np.bincount(t[accept], w*dx[accept], nt)
+            ay += np.bincount(t[accept], w*dy[accept], nt)
+
+            # leaves are summed body by body with the same rules as direct summation
+            owner, k = expand(self.start[node[leaf]], self.end[node[leaf]] - self.start[node[leaf]])
+            bt = t[leaf][owner]
+            src = self.order[k]
+            bx, by = spos[src, 0] - tpos[bt, 0], spos[src, 1] - tpos[bt, 1]
+            b2 = bx*bx + by*by
+            bd = np.sqrt(b2)
+            far = (bd >= tradius[bt] + sradius[src]) & (bd > 0)
+            w = np.divide(g_const*smass[src], b2*bd, out=np.zeros_like(bd), where=far)
+            ax += np.bincount(bt, w*bx, nt)
+            ay += np.bincount(bt, w*by, nt)
+            pairs += int(accept.sum()) + len(bt)
+
+            # everything else is opened into its children
+            opened = ~leaf & ~accept
+            owner, node = expand(self.first[node[opened]], self.count[node[opened]])
+            t = t[opened][owner]
+        return np.column_stack((ax, ay)), pairs
+
+def accelerations(tpos, tradius, spos, smass, sradius, g_const, theta, workers = 1):
+    return QuadTree(spos, smass, sradius).accelerations(tpos, tradius, spos, smass, sradius, g_const, theta, workers)
+
+if __name__ == "__main__":
+    import sys
+    import file_handler as fh
+    from simulation import Simulation
+    sim = Simulation(fh.fread(sys.argv[1])[-1])
+    print("theta   max error   rms error")
+    for theta in [0.1, 0.3, 0.5, 0.7, 1.0]:
+        error = sim.force_error(theta)
+        print(theta, "\t", error["max"], "\t", error["rms"])
@@ -0,0 +1,148 @@
+# Imports
+import os
+import numpy as np
+from config import Configuration
+
+# File layout (little endian, all 64-bit words):
+#   header   "GRAVIREC", version, every, slots, capacity, frames written, 2 unused
+#   meta     per slot: step, time, static count, dynamic count (float64)
+#   bodies   per slot: capacity rows of id, mass, x, y, vx, vy (float64), the static
+#            bodies first, then the dynamic ones
+# Frames are written to slot (frames written) % slots, so once the file is full the
+# oldest frame is overwritten.
+MAGIC = int(np.frombuffer(b"GRAVIREC", "<u8")[0])
+VERSION = 1
+HEAD = 8
+META = 4
+FIELDS = 6
+
+def _create(path, every, slots, capacity, written = 0):
+    # The file is only extended, not written, so unused slots take no disk space
+    with open(path, "wb") as file:
+        file.truncate(8*(HEAD + slots*META + slots*capacity*FIELDS))
+    raw = np.memmap(path, "<u8", "r+")
+    raw[:6] = [MAGIC, VERSION, every, slots, capacity, written]
+    raw.flush()
+
+def _open(path, mode):
+    raw = np.memmap(path, "<u8", mode)
+    if len(raw) < HEAD or raw[0] != MAGIC:
+        raise ValueError(path+" is not a gravi recording")
+    if raw[1] > VERSION:
+        raise ValueError("recording version "+str(int(raw[1]))+" is newer than this program ("+str(VERSION)+")")
+    slots, capacity = int(raw[3]), int(raw[4])
+    meta = raw[HEAD:HEAD + slots*META].view("<f8").reshape(slots, META)
+    start = HEAD + slots*META
+    bodies = raw[start:start + slots*capacity*FIELDS].view("<f8").reshape(slots, capacity, FIELDS)
+    return raw, meta, bodies
+
+class Recorder:
+
+    # Writes the bodies of every `every`-th step into a ring of `frames` frames in a
+    # memory-mapped file. A frame is written straight into the mapped file, so recording
+    # allocates nothing per step. Frames hold at most `capacity` bodies; the file is
+    # rebuilt with twice the room the first time a frame needs more.
+    # Used as an observer of a simulation: sim.observers.append(recorder.record)
+    def __init__(self, path, frames = 10000, capacity = 1024, every = 1):
+        self.path = path
+        _create(path, every, frames, capacity)
+        self._load()
+
+    # Methods
+    def record(self, sim):
+        if sim.steps % self.every:
+            return
+        s, d = sim.statics, sim.dynamics
+        ns, nd = len(s), len(d)
+        if ns + nd > self.capacity:
+            self._grow(ns + nd)
+        written = int(self.raw[5])
+        slot = written % self.slots
+        self.meta[slot] = (sim.steps, sim.time, ns, nd)
+        rows = self.bodies[slot]
+        for store, lo, hi in [(s, 0, ns), (d, ns, ns + nd)]:
+            rows[lo:hi, 0] = store.ids
+            rows[lo:hi, 1] = store.mass
+            rows[lo:hi, 2:4] = store.pos
+            rows[lo:hi, 4:6] = store.vel
+        # counted only once the frame is complete
+        self.raw[5] = written + 1
+
+    def __len__(self):
+        return min(int(self.raw[5]), self.slots)
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        self.flush()
+        del self.raw, self.meta, self.bodies
+
+    def _load(self):
+        self.raw, self.meta, self.bodies = _open(self.path, "r+")
+        self.every, self.slots, self.capacity = int(self.raw[2]), int(self.raw[3]), int(self.raw[4])
+
+    def _grow(self, n):
+        capacity = max(2*self.capacity, n)
+        _create(self.path+".tmp", self.every, self.slots, capacity, int(self.raw[5]))
+        raw, meta, bodies = _open(self.path+".tmp", "r+")
+        meta[:] = self.meta
+        bodies[:, :self.capacity] = self.bodies
+        raw.flush()
+        del raw, meta, bodies
+        self.close()
+        os.replace(self.path+".tmp", self.path)
+        self._load()
+
+
+class Recording:
+
+    # Read-only view of a recording, oldest frame first. Frames are Configurations
+    # whose arrays are views into the mapped file, so seeking costs nothing.
+    def __init__(self, path):
+        self.raw, self.meta, self.bodies = _open(path, "r")
+        self.every, self.slots = int(self.raw[2]), int(self.raw[3])
+        self.written = int(self.raw[5])
+
+    # Methods
+    def __len__(self):
+        return min(self.written, self.slots)
+
+    def _slot(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("recording index out of range")
+        return (self.written - len(self) + i) % self.slots
+
+    def __getitem__(self, i):
+        slot = self._slot(i)
+        ns, nd = int(self.meta[slot, 2]), int(self.meta[slot, 3])
+        rows = self.bodies[slot]
+        return Configuration(rows[:ns, 1:4], rows[ns:ns + nd, 1:6], [])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def info(self, i):
+        # Step number and simulated time of frame i
+        slot = self._slot(i)
+        return int(self.meta[slot, 0]), float(self.meta[slot, 1])
+
+    def ids(self, i):
+        # Ids of the static and dynamic bodies of frame i, to follow bodies between frames
+        slot = self._slot(i)
+        ns, nd = int(self.meta[slot, 2]), int(self.meta[slot, 3])
+        ids = self.bodies[slot, :ns + nd, 0].astype(np.int64)
+        return ids[:ns], ids[ns:]
+
+if __name__ == "__main__":
+    import sys
+    recording = Recording(sys.argv[1])
+    if len(recording) == 0:
+        print("Empty recording")
+    else:
+        first, last = recording.info(0), recording.info(-1)
+        print(len(recording), "frames, every", recording.every, "steps")
+        print("Steps", first[0], "to", last[0], "(time", first[1], "to", str(last[1])+")")
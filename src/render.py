@@ -0,0 +1,125 @@
+# Imports
+import numpy as np
+import pygame
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+# Above this many bodies on screen, dynamic bodies are drawn as single pixels in one
+# pass over the pixel array, and the whole window is updated
+DOTS = 5000
+# Above this many changed rectangles, updating the whole window is cheaper
+RECTS = 400
+
+class Renderer:
+
+    # Draws the bodies straight from the simulation arrays. Bodies outside the window
+    # are skipped, every radius is drawn once into a sprite that is then blitted, and
+    # only the parts of the window that changed since the last frame are updated.
+    # Traces are kept in a surface of their own, which is what the window is cleared
+    # back to while tracing.
+    def __init__(self):
+        self.screen = None
+        self.trails = None
+        self.sprites = {}
+        self.rects = []
+        self.full = True
+        self.tracing = False
+        self.font = None
+
+    # Methods
+    def clear(self):
+        # Wipes the window and the traces on the next frame
+        if self.trails is not None:
+            self.trails.fill(BLACK)
+        self.full = True
+
+    def sprite(self, radius):
+        if radius not in self.sprites:
+            sprite = pygame.Surface((2*radius, 2*radius))
+            sprite.set_colorkey(BLACK)
+            pygame.draw.circle(sprite, WHITE, (radius, radius), radius)
+            self.sprites[radius] = sprite
+        return self.sprites[radius]
+
+    def visible(self, store):
+        # Positions (rounded like the bodies used to be drawn) and radii of the bodies
+        # of a store that overlap the window
+        pos = np.rint(store.pos).astype(np.int64)
+        radius = store.radius.astype(np.int64)
+        w, h = self.screen.get_size()
+        keep = (pos[:, 0] + radius >= 0) & (pos[:, 0] - radius < w) & (pos[:, 1] + radius >= 0) & (pos[:, 1] - radius < h)
+        return pos[keep], radius[keep]
+
+    def draw(self, screen, sim, lines = None):
+        # lines: text shown in the top left corner, e.g. the performance overlay
+        # set_mode hands back the same surface when the window is resized
+        if screen is not self.screen or screen.get_size() != self.trails.get_size():
+            self.screen = screen
+            self.trails = pygame.Surface(screen.get_size())
+            self.full = True
+        if sim.tracing != self.tracing:
+            self.tracing = sim.tracing
+            self.trails.fill(BLACK)
+            self.full = True
+        dpos, dradius = self.visible(sim.dynamics)
+        spos, sradius = self.visible(sim.statics)
+        self.stats = sim.stats
+        if len(dpos) + len(spos) > DOTS:
+            self._dots(dpos, spos, sradius, lines)
+        else:
+            self._sprites(np.concatenate((dpos, spos)), np.concatenate((dradius, sradius)), lines)
+
+    def _background(self, rect = None):
+        if self.tracing:
+            self.screen.blit(self.trails, rect or (0, 0), rect)
+        else:
+            self.screen.fill(BLACK, rect)
+
+    def _text(self, lines):
+        # Draws lines of text and returns the rectangles they cover
+        if not lines:
+            return []
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        rects = []
+        for i, line in enumerate(lines):
+            text = self.font.render(line, True, WHITE, BLACK)
+            rects.append(self.screen.blit(text, (4, 4 + 14*i)))
+        return rects
+
+    def _sprites(self, pos, radius, lines):
+        blits = [(self.sprite(r), (x - r, y - r)) for (x, y), r in zip(pos.tolist(), radius.tolist())]
+        if self.full:
+            self._background()
+        else:
+            for rect in self.rects:
+                self._background(rect)
+        if self.tracing:
+            self.trails.blits(blits, False)
+        rects = self.screen.blits(blits) + self._text(lines)
+        with self.stats.phase("flip"):
+            if self.full or len(rects) + len(self.rects) > RECTS:
+                pygame.display.flip()
+            else:
+                pygame.display.update(self.rects + rects)
+        self.rects = rects
+        self.full = False
+
+    def _dots(self, dpos, spos, sradius, lines):
+        target = self.trails if self.tracing else self.screen
+        pixels = pygame.surfarray.pixels2d(target)
+        if not self.tracing:
+            pixels[:] = 0
+        w, h = pixels.shape
+        inside = (dpos[:, 0] >= 0) & (dpos[:, 0] < w) & (dpos[:, 1] >= 0) & (dpos[:, 1] < h)
+        pixels[dpos[inside, 0], dpos[inside, 1]] = target.map_rgb(WHITE)
+        del pixels
+        if self.tracing:
+            self.screen.blit(self.trails, (0, 0))
+        # static bodies are few and keep their size
+        self.screen.blits([(self.sprite(r), (x - r, y - r)) for (x, y), r in zip(spos.tolist(), sradius.tolist())], False)
+        self._text(lines)
+        with self.stats.phase("flip"):
+            pygame.display.flip()
+        self.rects = []
+        self.full = True
@@ -0,0 +1,50 @@
+# Imports
+import time
+import pygame
+
+# Longest real time (seconds) made up for in one frame, so pauses and slow frames
+# do not have to be caught up with afterwards
+MAX_LAG = 0.25
+
+class Scheduler:
+
+    # Paces the main loop. Every frame runs `substeps` physics steps or, when rate is
+    # set, as many steps as keep the simulation `rate` time units ahead per real second.
+    # Frames are drawn at most fps times a second; when the physics of a frame took
+    # longer than a frame, drawing is skipped (at most max_skip frames in a row) so
+    # the simulation can catch up.
+    def __init__(self, fps = 60, substeps = 1, rate = 0, max_skip = 5):
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+        self.substeps = substeps
+        self.rate = rate
+        self.max_skip = max_skip
+        self.owed = 0.0
+        self.skipped = 0
+        self.start = self.last = time.perf_counter()
+
+    # Methods
+    def steps(self, time_step):
+        # Number of physics steps to run this frame
+        if self.rate <= 0:
+            return self.substeps
+        now = time.perf_counter()
+        self.owed += min(now - self.last, MAX_LAG)*self.rate
+        self.last = now
+        n = int(self.owed // time_step)
+        self.owed -= n*time_step
+        return n
+
+    def draw(self):
+        # Whether to draw this frame
+        behind = time.perf_counter() - self.start > 1/self.fps
+        if behind and self.skipped < self.max_skip:
+            self.skipped += 1
+            return False
+        self.skipped = 0
+        return True
+
+    def tick(self):
+        # Waits for the next frame
+        self.clock.tick(self.fps)
+        self.start = time.perf_counter()
@@ -0,0 +1,257 @@
+# Imports
+import numpy as np
+import field
+import gravity
+import mesh
+import quadtree
+import spatial
+from integrators import INTEGRATORS
+from store import BodyStore
+from stats import Stats
+from config import Configuration, SETTINGS
+
+SOLVERS = ["direct", "tree", "mesh"]
+
+class Simulation:
+
+    # Constructor
+    def __init__(self, config = None, seed = None):
+        self.statics = BodyStore()
+        self.dynamics = BodyStore()
+        for name, default in SETTINGS:
+            setattr(self, name, default)
+        self.steps = 0
+        self.time = 0.0
+        self.removed = 0
+        self.evaluations = 0
+        self._acc_key = None
+        self._field = None
+        self._field_key = None
+        self.stats = Stats()
+        # random numbers for the simulation (e.g. add_random); a checkpoint saves its state
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.rng = np.random.default_rng(self.seed)
+        # functions called with the simulation after every step, e.g. Recorder.record
+        self.observers = []
+        if config is not None:
+            self.load(config)
+
+    # Body views (built on demand from the arrays, for the UI and printing)
+    @property
+    def static_bodies(self):
+        return self.statics.static_bodies()
+
+    @property
+    def dynamic_bodies(self):
+        return self.dynamics.dynamic_bodies()
+
+    # Methods
+    def __repr__(self):
+        return str(len(self.statics))+" static bodies, "+str(len(self.dynamics))+" dynamic bodies"
+
+    def settings(self):
+        return [getattr(self, name) for name, default in SETTINGS]
+
+    def set_settings(self, settings):
+        for i in range(len(SETTINGS)):
+            name, default = SETTINGS[i]
+            setattr(self, name, settings[i] if i < len(settings) else default)
+
+    def config(self):
+        return Configuration(self.statics.static_array(), self.dynamics.dynamic_array(), self.settings())
+
+    def load(self, config):
+        static, dynamic = config.arrays()
+        self.statics.load(static)
+        self.dynamics.load(dynamic)
+        self.set_settings(config.settings)
+
+    def add_static(self, mass, pos):
+        i = self.statics.add(mass, pos)
+        return self.statics.static_bodies()[i]
+
+    def add_dynamic(self, mass, pos, vel):
+        i = self.dynamics.add(mass, pos, vel)
+        return self.dynamics.dynamic_bodies()[i]
+
+    def add_random(self):
+        # Dynamic body of mass cmass somewhere in the middle half of the window, with a
+        # random velocity
+        x, y, vx, vy = self.rng.random(4).tolist()
+        return self.add_dynamic(self.cmass, [self.size/4 + x*self.size/2, self.size/4 + y*self.size/2], [(vx*self.size - self.size/2)/800, (vy*self.size - self.size/2)/800])
+
+    def clear_static(self):
+        self.statics.clear()
+
+    def clear_dynamic(self):
+        self.dynamics.clear()
+
+    def halt(self):
+        self.dynamics.vel[:] = 0
+        self.dynamics.modified()
+
+    def sources(self):
+        s, d = self.statics, self.dynamics
+        pos = np.concatenate((d.pos, s.pos))
+        mass = np.concatenate((d.mass, s.mass))
+        radius = np.concatenate((d.radius, s.radius))
+        return pos, mass, radius
+
+    def accelerations(self, solver = None, theta = None, targets = None):
+        # Accelerations of all dynamic bodies, or only of the indices in targets
+        solver = self.solver if solver is None else solver
+        theta = self.theta if theta is None else theta
+        d = self.dynamics
+        tpos, tradius = d.pos, d.radius
+        if targets is not None:
+            tpos, tradius = tpos[targets], tradius[targets]
+        self.evaluations += len(tpos)
+        static = self.field()
+        if static is None:
+            pos, mass, radius = self.sources()
+        else:
+            pos, mass, radius = d.pos, d.mass, d.radius
+        with self.stats.phase("forces"):
+            # pairs counts what the solver evaluates: pairs of bodies, bodies and
+            # tree cells, or bodies and grid points
+            if solver == "tree":
+                tree = quadtree.QuadTree(pos, mass, radius)
+                acc = tree.accelerations(tpos, tradius, pos, mass, radius, self.g_const, theta, self.workers)
+                self.stats.count("pairs", tree.pairs)
+            elif solver == "mesh":
+                acc = mesh.accelerations(tpos, pos, mass, self.g_const, self.mesh_size, self.mesh_pad)
+                self.stats.count("pairs", mesh.work(len(tpos), len(pos), self.mesh_size, self.mesh_pad))
+            else:
+                acc = gravity.direct(tpos, tradius, pos, mass, radius, self.g_const, self.workers)
+                self.stats.count("pairs", len(tpos)*len(pos))
+            if static is not None:
+                acc += static.accelerations(tpos, tradius)
+        return acc
+
+    def field(self):
+        # The grid of static body accelerations when static_field (its cell width) is
+        # set, rebuilt whenever static bodies or the area it has to cover changed
+        s = self.statics
+        if self.static_field <= 0 or len(s) == 0:
+            return None
+        key = (s.version, self.g_const, self.size, self.buffer, self.static_field)
+        if key != self._field_key:
+            self._field = field.StaticField(s.pos, s.mass, s.radius, self.g_const, -self.buffer, self.size + self.buffer, self.static_field, self.workers)
+            self._field_key = key
+        return self._field
+
+    def acc_key(self):
+        # Everything the stored accelerations depend on besides the positions
+        return (self.dynamics.version, self.statics.version, self.g_const, self.solver, self.theta, self.static_field, self.size, self.buffer, self.mesh_size, self.mesh_pad)
+
+    def moved(self):
+        # to be called when positions moved without the accelerations being recomputed
+        self._acc_key = None
+
+    def update_accelerations(self, force = False):
+        # Accelerations are kept in the store and only recomputed when bodies or
+        # force settings changed, or when asked to after positions moved
+        key = self.acc_key()
+        if force or key != self._acc_key:
+            self.dynamics.acc[:] = self.accelerations()
+            self._acc_key = key
+        return self.dynamics.acc
+
+    def energy(self):
+        s, d = self.statics, self.dynamics
+        kinetic = 0.5*(d.mass*(d.vel**2).sum(axis=1)).sum()
+        dd = gravity.potential(d.pos, d.mass, d.radius, d.pos, d.mass, d.radius, self.g_const).sum()/2
+        ds = gravity.potential(d.pos, d.mass, d.radius, s.pos, s.mass, s.radius, self.g_const).sum()
+        return float(kinetic + dd + ds)
+
+    def force_error(self, theta = None):
+        # Error of the Barnes-Hut accelerations against exact direct summation
+        return gravity.errors(self.accelerations("direct"), self.accelerations("tree", theta))
+
+    def step(self, n = 1):
+        for i in range(n):
+            self._step()
+        return self
+
+    def run(self, until):
+        # until is either a simulated time or a callable taking the simulation
+        if callable(until):
+            while not until(self):
+                self._step()
+        else:
+            while self.time < until:
+                self._step()
+        return self
+
+    def _step(self):
+        d = self.dynamics
+        if self.sim_mode == 2:
+            with self.stats.phase("merge"):
+                self._merge()
+        pos = d.pos
+        lo, hi = -self.buffer, self.size + self.buffer
+        inside = ((pos >= lo) & (pos <= hi)).all(axis=1)
+        if not inside.all():
+            gone = len(inside) - int(np.count_nonzero(inside))
+            self.removed += gone
+            self.stats.count("removed", gone)
+            d.keep(inside)
+        if self.wall:
+            outside = (d.pos < 0) | (d.pos > self.size)
+            d.vel[outside] = -d.vel[outside]
+        with self.stats.phase("integrate"):
+            INTEGRATORS[self.integrator](self, self.time_step)
+        self.steps += 1
+        self.time += self.time_step
+        for observer in self.observers:
+            observer(self)
+
+    def _merge(self):
+        # Touching bodies merge, conserving mass and momentum. A dynamic body touching
+        # static bodies joins the one with the lowest id; touching dynamic bodies merge
+        # into the heaviest of their group (lowest id on ties). Results do not depend
+        # on the order bodies are stored in.
+        s, d = self.statics, self.dynamics
+        nd, n = len(d), len(d) + len(s)
+        pos, mass, radius = self.sources()
+        i, j = spatial.overlaps(pos, radius)
+        dynamic = i < nd
+        i, j = i[dynamic], j[dynamic]
+        if len(i) == 0:
+            return
+        ids = np.concatenate((d.ids, s.ids))
+        target = np.arange(n)
+
+        static = j >= nd
+        order = np.lexsort((ids[j[static]], i[static]))
+        a, b = i[static][order], j[static][order]
+        first = np.ones(len(a), dtype=bool)
+        first[1:] = a[1:] != a[:-1]
+        target[a[first]] = b[first]
+
+        free = ~static & (target[i] == i) & (target[j] == j)
+        label = spatial.components(nd, i[free], j[free])
+        order = np.lexsort((ids[:nd], -mass[:nd], label))
+        head = np.ones(nd, dtype=bool)
+        head[1:] = label[order][1:] != label[order][:-1]
+        survivor = np.empty(nd, dtype=np.intp)
+        survivor[label[order][head]] = order[head]
+        grouped = target[:nd] == np.arange(nd)
+        target[:nd][grouped] = survivor[label[grouped]]
+
+        merged = np.flatnonzero(target[:nd] != np.arange(nd))
+        self.stats.count("merged", len(merged))
+        into = np.unique(target[merged])
+        m = np.bincount(target, mass, n)[into]
+        x = np.bincount(target, mass*pos[:, 0], n)[into]/m
+        y = np.bincount(target, mass*pos[:, 1], n)[into]/m
+        vx = np.bincount(target[:nd], mass[:nd]*d.vel[:, 0], n)[into]/m
+        vy = np.bincount(target[:nd], mass[:nd]*d.vel[:, 1], n)[into]/m
+        for store, rows, k in [(d, into < nd, into[into < nd]), (s, into >= nd, into[into >= nd] - nd)]:
+            store.pos[k, 0], store.pos[k, 1] = x[rows], y[rows]
+            store.set_mass(k, m[rows])
+        k = into[into < nd]
+        d.vel[k, 0], d.vel[k, 1] = vx[into < nd], vy[into < nd]
+        gone = np.zeros(nd, dtype=bool)
+        gone[merged] = True
+        d.keep(~gone)
@@ -0,0 +1,78 @@
+# Imports
+import numpy as np
+from gravity import expand
+
+# A cell and the neighbours after it; every pair of neighbouring cells is visited once
+NEIGHBOURS = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+def candidates(pos, radius):
+    # Pairs (i, j), i < j, that share or neighbour a grid cell. Cells are as wide
+    # as the largest possible contact distance, so no touching pair is missed.
+    n = len(pos)
+    if n < 2:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    cell = max(2*float(radius.max()), 1e-9)
+    c = np.floor(pos/cell).astype(np.int64)
+    c -= c.min(axis=0) - 1
+    width = int(c[:, 1].max()) + 2
+    key = c[:, 0]*width + c[:, 1]
+    order = np.argsort(key, kind="stable")
+    skey = key[order]
+    first, second = [], []
+    for dx, dy in NEIGHBOURS:
+        nkey = key + dx*width + dy
+        lo = np.searchsorted(skey, nkey, "left")
+        hi = np.searchsorted(skey, nkey, "right")
+        i, k = expand(lo, hi - lo)
+        j = order[k]
+        if (dx, dy) == (0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        first.append(np.minimum(i, j))
+        second.append(np.maximum(i, j))
+    return np.concatenate(first), np.concatenate(second)
+
+def overlaps(pos, radius):
+    # Pairs (i, j), i < j, of bodies whose circles overlap, excluding coincident bodies
+    i, j = candidates(pos, radius)
+    d = np.sqrt(((pos[j] - pos[i])**2).sum(axis=1))
+    touch = (d < radius[i] + radius[j]) & (d > 0)
+    return i[touch], j[touch]
+
+def components(n, i, j):
+    # Label of the connected component of every node, given the edges (i, j)
+    label = np.arange(n)
+    while True:
+        low = np.minimum(label[i], label[j])
+        new = label.copy()
+        np.minimum.at(new, i, low)
+        np.minimum.at(new, j, low)
+        new = new[new]
+        if (new == label).all():
+            return label
+        label = new
+
+def near(pos, other, reach):
+    # Pairs (i, j) of a point pos[i] and a point other[j] in the same or neighbouring
+    # grid cells of width reach, which includes every pair closer than reach
+    if len(pos) == 0 or len(other) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    c = np.floor(pos/reach).astype(np.int64)
+    o = np.floor(other/reach).astype(np.int64)
+    low = np.minimum(c.min(axis=0), o.min(axis=0)) - 1
+    c, o = c - low, o - low
+    width = int(max(c[:, 1].max(), o[:, 1].max())) + 2
+    okey = o[:, 0]*width + o[:, 1]
+    order = np.argsort(okey, kind="stable")
+    skey = okey[order]
+    key = c[:, 0]*width + c[:, 1]
+    first, second = [], []
+    for dx in [-1, 0, 1]:
+        for dy in [-1, 0, 1]:
+            nkey = key + dx*width + dy
+            lo = np.searchsorted(skey, nkey, "left")
+            hi = np.searchsorted(skey, nkey, "right")
+            i, k = expand(lo, hi - lo)
+            first.append(i)
+            second.append(order[k])
+    return np.concatenate(first), np.concatenate(second)
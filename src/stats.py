@@ -0,0 +1,126 @@
+# Imports
+import time
+
+class _Timer:
+
+    # Constructor
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    # Methods
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.add(self.name, time.perf_counter() - self.start)
+
+
+class _Off:
+
+    # Stands in for a timer while stats are off
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_OFF = _Off()
+
+class Stats:
+
+    # Time spent per phase and counts of what happened, averaged per frame over the
+    # last `window` frames. The main loop times its phases with lap(); code inside a
+    # phase times parts of it with `with stats.phase(name)`. While disabled nothing is
+    # timed or counted, so each call only costs a check of self.enabled.
+    def __init__(self, enabled = False, window = 30):
+        self.enabled = enabled
+        self.window = window
+        self.report = None
+        self.profiler = None
+        self.reset()
+
+    # Methods
+    def reset(self):
+        self.times = {}
+        self.counts = {}
+        self.gauges = {}
+        self.frames = 0
+        self.started = self.last = time.perf_counter()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.report = None
+        self.reset()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _OFF
+        return _Timer(self, name)
+
+    def lap(self, name = None):
+        # Adds the time since the last lap to phase name (None only restarts the clock)
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if name is not None:
+            self.add(name, now - self.last)
+        self.last = now
+
+    def add(self, name, seconds):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def count(self, name, k = 1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + k
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def frame(self):
+        # Called once per frame; publishes the averages every `window` frames
+        if self.profiler is not None:
+            self._profile_frame()
+        if not self.enabled:
+            return
+        self.frames += 1
+        if self.frames >= self.window:
+            seconds = time.perf_counter() - self.started
+            self.report = {
+                "fps": self.frames/seconds,
+                "ms": {name: 1000*t/self.frames for name, t in self.times.items()},
+                "per_frame": {name: k/self.frames for name, k in self.counts.items()},
+                "gauges": dict(self.gauges),
+            }
+            self.reset()
+
+    def lines(self):
+        if self.report is None:
+            return ["(measuring)"] if self.enabled else []
+        r = self.report
+        lines = ["fps "+str(round(r["fps"], 1))]
+        lines += [name+" "+str(round(ms, 2))+" ms" for name, ms in r["ms"].items()]
+        lines += [name+" "+str(round(k, 1))+"/frame" for name, k in r["per_frame"].items()]
+        lines += [name+" "+str(value) for name, value in r["gauges"].items()]
+        return lines
+
+    # Profiling
+    def profile(self, frames, path):
+        # Runs cProfile over the next `frames` frames and saves the result to path
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profile_frames = frames
+        self.profile_path = path
+        self.profiler.enable()
+
+    def _profile_frame(self):
+        self.profile_frames -= 1
+        if self.profile_frames > 0:
+            return
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profile_path)
+        print("Profile saved to", self.profile_path)
+        import pstats
+        pstats.Stats(self.profiler).sort_stats("cumulative").print_stats(15)
+        self.profiler = None
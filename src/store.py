@@ -0,0 +1,144 @@
+# Imports
+import numpy as np
+from bodies import StaticBody, DynamicBody
+
+def body_radius(mass):
+    return np.ceil(4*np.asarray(mass, dtype=float)**(1/3))
+
+class BodyStore:
+
+    # Constructor
+    def __init__(self, capacity = 16):
+        self.n = 0
+        self.next_id = 0
+        # bumped whenever bodies are added, removed or change mass; edited is the
+        # last version that did more than append bodies
+        self.version = 0
+        self.edited = 0
+        self._mass = np.zeros(capacity)
+        self._radius = np.zeros(capacity)
+        self._pos = np.zeros((capacity, 2))
+        self._vel = np.zeros((capacity, 2))
+        self._acc = np.zeros((capacity, 2))
+        self._ids = np.zeros(capacity, dtype=np.int64)
+
+    # Array views (only the first n rows are live)
+    @property
+    def mass(self):
+        return self._mass[:self.n]
+
+    @property
+    def radius(self):
+        return self._radius[:self.n]
+
+    @property
+    def pos(self):
+        return self._pos[:self.n]
+
+    @pos.setter
+    def pos(self, value):
+        self._pos[:self.n] = value
+
+    @property
+    def vel(self):
+        return self._vel[:self.n]
+
+    @vel.setter
+    def vel(self, value):
+        self._vel[:self.n] = value
+
+    @property
+    def acc(self):
+        return self._acc[:self.n]
+
+    @acc.setter
+    def acc(self, value):
+        self._acc[:self.n] = value
+
+    @property
+    def ids(self):
+        return self._ids[:self.n]
+
+    # Methods
+    def __len__(self):
+        return self.n
+
+    def reserve(self, extra):
+        needed = self.n + extra
+        capacity = len(self._mass)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ["_mass", "_radius", "_pos", "_vel", "_acc", "_ids"]:
+            old = getattr(self, name)
+            new = np.zeros((capacity,)+old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def add(self, mass, pos, vel = (0, 0)):
+        self.extend([mass], [pos], [vel])
+        return self.n - 1
+
+    def extend(self, mass, pos, vel = None):
+        mass = np.asarray(mass, dtype=float)
+        k = len(mass)
+        self.reserve(k)
+        i, j = self.n, self.n + k
+        self._mass[i:j] = mass
+        self._radius[i:j] = body_radius(mass)
+        self._pos[i:j] = pos
+        self._vel[i:j] = 0 if vel is None else vel
+        self._acc[i:j] = 0
+        self._ids[i:j] = np.arange(self.next_id, self.next_id + k)
+        self.n = j
+        self.next_id += k
+        self.version += 1
+
+    def keep(self, mask):
+        k = int(np.count_nonzero(mask))
+        for name in ["_mass", "_radius", "_pos", "_vel", "_acc", "_ids"]:
+            arr = getattr(self, name)
+            arr[:k] = arr[:self.n][mask]
+        self.n = k
+        self.modified()
+
+    def clear(self):
+        self.n = 0
+        self.modified()
+
+    def modified(self):
+        # to be called after existing rows were changed outside of a time step
+        self.version += 1
+        self.edited = self.version
+
+    def set_mass(self, index, mass):
+        self._mass[index] = mass
+        self._radius[index] = body_radius(mass)
+        self.modified()
+
+    # Conversion
+    def static_array(self, start = 0):
+        return np.column_stack((self.mass[start:], self.pos[start:]))
+
+    def dynamic_array(self, start = 0):
+        return np.column_stack((self.mass[start:], self.pos[start:], self.vel[start:]))
+
+    def load(self, array):
+        array = np.asarray(array, dtype=float)
+        self.clear()
+        if array.shape[1] > 3:
+            self.extend(array[:, 0], array[:, 1:3], array[:, 3:5])
+        else:
+            self.extend(array[:, 0], array[:, 1:3])
+
+    def static_bodies(self):
+        return [StaticBody(m, p) for m, p in zip(self.mass.tolist(), self.pos.tolist())]
+
+    def dynamic_bodies(self):
+        bodies = []
+        for m, p, v, a in zip(self.mass.tolist(), self.pos.tolist(), self.vel.tolist(), self.acc.tolist()):
+            body = DynamicBody(m, p, v)
+            body.acc.x, body.acc.y = a
+            bodies.append(body)
+        return bodies
@@ -0,0 +1,258 @@
+# Imports
+import os
+import sys
+import time
+import stat
+import struct
+import asyncio
+import argparse
+import threading
+import numpy as np
+
+# Frames sent to every connected viewer (little endian):
+#   header   tag "GRVF", window size (uint32), step (uint64), time (float64),
+#            static count, dynamic count (uint64)
+#   bodies   float64 masses of the static bodies, then their positions as rows
+#            [x, y], then the same for the dynamic bodies
+# Radii are not sent, since they follow from the masses (store.body_radius).
+HEADER = struct.Struct("<4sIQdQQ")
+TAG = b"GRVF"
+ADDRESS = "127.0.0.1:5757"
+# Seconds viewers get to receive the frame they are being sent when the publisher closes
+GRACE = 1.0
+
+def endpoint(address):
+    # "host:port", or a path (containing a /) to a Unix socket
+    if "/" in address:
+        return None, address
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def encode(sim):
+    # The arrays are gathered into the frame straight from the stores through
+    # memoryviews, so each frame is copied once however many viewers there are
+    s, d = sim.statics, sim.dynamics
+    parts = [HEADER.pack(TAG, int(sim.size), sim.steps, sim.time, len(s), len(d))]
+    for array in [s.mass, s.pos, d.mass, d.pos]:
+        parts.append(memoryview(np.asarray(array, dtype="<f8")))
+    return b"".join(parts)
+
+class Frame:
+
+    # A received frame; the arrays are views into the received bytes
+    def __init__(self, data):
+        tag, self.size, self.step, self.time, ns, nd = HEADER.unpack_from(data)
+        if tag != TAG:
+            raise ValueError("not a gravi frame")
+        offset = HEADER.size
+        arrays = []
+        for n, columns in [(ns, 1), (ns, 2), (nd, 1), (nd, 2)]:
+            arrays.append(np.frombuffer(data, "<f8", n*columns, offset).reshape(n, columns) if columns > 1 else np.frombuffer(data, "<f8", n, offset))
+            offset += 8*n*columns
+        self.static_mass, self.static_pos, self.dynamic_mass, self.dynamic_pos = arrays
+
+    def load(self, sim):
+        # Puts the bodies into a simulation, e.g. to draw it with render.Renderer
+        sim.size = self.size
+        sim.steps, sim.time = self.step, self.time
+        sim.statics.clear()
+        sim.statics.extend(self.static_mass, self.static_pos)
+        sim.dynamics.clear()
+        sim.dynamics.extend(self.dynamic_mass, self.dynamic_pos)
+
+async def receive(reader):
+    head = await reader.readexactly(HEADER.size)
+    tag, size, step, t, ns, nd = HEADER.unpack(head)
+    return Frame(head + await reader.readexactly(24*(ns + nd)))
+
+async def connect(address = ADDRESS):
+    host, port = endpoint(address)
+    if host is None:
+        return await asyncio.open_unix_connection(port)
+    return await asyncio.open_connection(host, port)
+
+async def frames(address = ADDRESS):
+    # Every frame the publisher sends this viewer, until it closes the connection
+    reader, writer = await connect(address)
+    try:
+        while True:
+            try:
+                yield await receive(reader)
+            except asyncio.IncompleteReadError:
+                return
+    finally:
+        writer.close()
+
+
+class _Client:
+
+    # Constructor
+    def __init__(self, writer):
+        self.writer = writer
+        self.task = asyncio.current_task()
+        self.frame = None
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+
+class Publisher:
+
+    # Serves the frames of a simulation to any number of viewers over TCP or a Unix
+    # socket, at most `rate` frames per second (0: every step). The server runs an
+    # asyncio loop on a thread of its own. Each viewer is sent the newest frame once
+    # it has received the previous one; frames a slow viewer had no time for are
+    # dropped for that viewer only, so it never holds up the simulation or the others.
+    # Used as an observer of a simulation: sim.observers.append(publisher.publish)
+    def __init__(self, address = ADDRESS, rate = 30):
+        self.address = address
+        self.rate = rate
+        self.clients = set()
+        self.published = 0
+        self.last = 0.0
+        self.loop = asyncio.new_event_loop()
+        self.error = None
+        started = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(started,), daemon=True)
+        self.thread.start()
+        started.wait()
+        if self.error is not None:
+            raise self.error
+
+    # Methods
+    def publish(self, sim):
+        now = time.monotonic()
+        if self.rate and now - self.last < 1/self.rate or not self.clients:
+            return
+        self.last = now
+        self.published += 1
+        self.loop.call_soon_threadsafe(self._broadcast, encode(sim))
+
+    def close(self):
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    # Server (on the publisher's thread)
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        host, port = endpoint(self.address)
+        try:
+            if host is None:
+                # a socket file left behind by an earlier run
+                if os.path.exists(port) and stat.S_ISSOCK(os.stat(port).st_mode):
+                    os.unlink(port)
+                self.server = self.loop.run_until_complete(asyncio.start_unix_server(self._serve, port))
+            else:
+                self.server = self.loop.run_until_complete(asyncio.start_server(self._serve, host, port))
+        except OSError as e:
+            self.error = e
+            started.set()
+            return
+        started.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _serve(self, reader, writer):
+        client = _Client(writer)
+        # drain() only returns once the frame is fully sent, so at most one frame per
+        # viewer is ever queued
+        writer.transport.set_write_buffer_limits(0)
+        self.clients.add(client)
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                frame, client.frame = client.frame, None
+                if frame is None:
+                    break
+                writer.write(frame)
+                await writer.drain()
+                client.sent += 1
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    def _broadcast(self, frame):
+        for client in self.clients:
+            if client.frame is not None:
+                client.dropped += 1
+            client.frame = frame
+            client.ready.set()
+
+    async def _close(self):
+        self.server.close()
+        for client in self.clients:
+            # no frame ends the viewer's loop once it sent the frame it is sending
+            client.frame = None
+            client.ready.set()
+        tasks = [client.task for client in self.clients]
+        if tasks:
+            await asyncio.wait(tasks, timeout=GRACE)
+        for client in list(self.clients):
+            client.writer.transport.abort()
+        await self.server.wait_closed()
+        host, port = endpoint(self.address)
+        if host is None and os.path.exists(port):
+            os.unlink(port)
+
+
+async def view(address, fps = 60):
+    # Shows the frames of a publisher in a window. T toggles tracing, Q or closing the
+    # window quits.
+    import pygame
+    from render import Renderer
+    from simulation import Simulation
+    latest = [None, 0]
+
+    async def read():
+        async for frame in frames(address):
+            latest[0] = frame
+            latest[1] += 1
+
+    reader = asyncio.ensure_future(read())
+    pygame.init()
+    screen = None
+    renderer = Renderer()
+    sim = Simulation()
+    shown = 0
+    while not reader.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_q:
+                reader.cancel()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_t:
+                sim.tracing = not sim.tracing
+        frame = latest[0]
+        if frame is not None and latest[1] != shown:
+            shown = latest[1]
+            frame.load(sim)
+            if screen is None or screen.get_width() != frame.size:
+                screen = pygame.display.set_mode((frame.size, frame.size))
+                pygame.display.set_caption("gravi "+address)
+            renderer.draw(screen, sim, ["Step "+str(frame.step)+", time "+str(round(frame.time, 3)), str(shown)+" frames received"])
+        await asyncio.sleep(1/fps)
+    pygame.quit()
+    if not reader.cancelled() and reader.exception() is not None:
+        raise reader.exception()
+
+async def show(address):
+    # Prints a line per received frame instead of drawing it
+    async for frame in frames(address):
+        print("step", frame.step, "time", frame.time, len(frame.static_mass), "static", len(frame.dynamic_mass), "dynamic", flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a simulation published with gravi run --stream.")
+    parser.add_argument("address", nargs="?", default=ADDRESS, help="host:port or the path of a Unix socket (Default: "+ADDRESS+")")
+    parser.add_argument("--fps", type=float, default=60, help="most frames drawn per second")
+    parser.add_argument("--text", action="store_true", help="print the frames instead of opening a window")
+    args = parser.parse_args()
+    try:
+        asyncio.run(show(args.address) if args.text else view(args.address, args.fps))
+    except (ConnectionRefusedError, FileNotFoundError) as e:
+        print("Could not connect to", args.address+":", e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
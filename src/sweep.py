@@ -0,0 +1,111 @@
+# Imports
+import os
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import SETTINGS, parse_setting
+
+NAMES = [name for name, default in SETTINGS]
+
+def grid(params):
+    # Every combination of the given values, e.g. {"g_const": [1.2, 2.4], "sim_mode": [1, 2]}
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*[params[n] for n in names])]
+
+def key(run):
+    return json.dumps(run, sort_keys=True)
+
+def run_one(run, steps):
+    # Runs in a worker process; the starting configuration is read from disk there
+    # so only file names and settings travel between processes
+    import file_handler as fh
+    from simulation import Simulation
+    run = dict(run)
+    sim = Simulation(fh.fread(run.pop("config"))[-1])
+    for name, value in run.items():
+        setattr(sim, name, value)
+    bodies = len(sim.dynamics)
+    e0 = sim.energy()
+    start = time.perf_counter()
+    sim.step(steps)
+    seconds = time.perf_counter() - start
+    e1 = sim.energy()
+    return {
+        "steps": steps,
+        "seconds": seconds,
+        "steps_per_second": steps/seconds if seconds > 0 else 0.0,
+        "dynamic_bodies": [bodies, len(sim.dynamics)],
+        "removed": sim.removed,
+        "evaluations": sim.evaluations,
+        "energy": [e0, e1],
+        "drift": abs(e1 - e0)/abs(e0) if e0 != 0 else 0.0,
+    }
+
+def done(out):
+    # Runs already in the results file; a line cut off by a crash is ignored
+    finished = set()
+    if out is None or not os.path.exists(out):
+        return finished
+    for line in open(out):
+        try:
+            finished.add(key(json.loads(line)["run"]))
+        except (ValueError, KeyError):
+            pass
+    return finished
+
+def sweep(runs, steps, out = None, workers = None):
+    # Runs every configuration in a process pool and yields the results as they
+    # finish. Results are appended to out, and runs already in out are skipped.
+    finished = done(out)
+    todo = [run for run in runs if key(run) not in finished]
+    file = open(out, "a") if out is not None else None
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(run_one, run, steps): run for run in todo}
+            for future in as_completed(futures):
+                result = {"run": futures[future]}
+                try:
+                    result["result"] = future.result()
+                except Exception as e:
+                    result["error"] = repr(e)
+                if file is not None:
+                    file.write(json.dumps(result)+"\n")
+                    file.flush()
+                yield result
+    finally:
+        if file is not None:
+            file.close()
+
+def parse(assignment):
+    # "g_const=1.2,2.4" -> ("g_const", [1.2, 2.4])
+    name, values = assignment.split("=", 1)
+    values = values.split(",")
+    if name == "config":
+        return name, values
+    if name not in NAMES:
+        raise ValueError("unknown setting "+name)
+    return name, [parse_setting(NAMES.index(name), v) for v in values]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a grid of simulations in parallel.")
+    parser.add_argument("config", help="file in configs/ to start from (the last frame is used)")
+    parser.add_argument("params", nargs="*", help="setting=value,value,... (config=file,file,... varies the starting file)")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--out", help="results file (JSON lines); runs already in it are skipped")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    params = {"config": [args.config]}
+    params.update(dict(parse(p) for p in args.params))
+    runs = grid(params)
+    total = len(runs)
+    skipped = len(done(args.out) & set(key(run) for run in runs))
+    if skipped:
+        print(skipped, "runs already in", args.out)
+    for i, result in enumerate(sweep(runs, args.steps, args.out, args.workers), skipped):
+        if "error" in result:
+            print(i+1, "/", total, result["run"], "error:", result["error"])
+        else:
+            r = result["result"]
+            print(i+1, "/", total, result["run"], round(r["steps_per_second"], 1), "steps/s", "drift", r["drift"])
@@ -0,0 +1,55 @@
+# Imports
+import queue
+import threading
+
+class Writer:
+
+    # Runs slow jobs (saving simulations and screenshots) one after another on a
+    # background thread, so the main loop keeps running while they are written. At
+    # most `size` jobs wait at a time; submitting more waits for one to finish.
+    # Outcomes are printed by report(), called from the main loop, so they never
+    # appear in the middle of a prompt. notify is called on the background thread
+    # after every job, e.g. to wake up a loop waiting for events.
+    def __init__(self, size = 4, notify = None):
+        self.jobs = queue.Queue(size)
+        self.results = queue.Queue()
+        self.notify = notify
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Methods
+    def submit(self, name, function, *args, done = None):
+        # Runs function(*args) in the background. Once it finished, report() prints
+        # whether name was saved and calls done(ok) on the main thread.
+        self.jobs.put((name, function, args, done))
+
+    def report(self):
+        while True:
+            try:
+                name, error, done = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if error is None:
+                print(name, "saved")
+            else:
+                print("Could not save", name+":", error)
+            if done is not None:
+                done(error is None)
+
+    def wait(self):
+        # Blocks until every submitted job is finished and reported
+        self.jobs.join()
+        self.report()
+
+    def _run(self):
+        while True:
+            name, function, args, done = self.jobs.get()
+            try:
+                function(*args)
+                error = None
+            except Exception as e:
+                error = e
+            self.results.put((name, error, done))
+            self.jobs.task_done()
+            if self.notify is not None:
+                self.notify()